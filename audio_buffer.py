@@ -0,0 +1,195 @@
+"""
+Buffers de audio preasignados para el pipeline de captura.
+"""
+import threading
+
+import numpy as np
+
+
+class Wakeup:
+    """Aviso de datos nuevos de uno o varios productores a un consumidor que duerme.
+
+    El productor (el callback de PortAudio) sólo marca ``pending`` y toca el
+    ``threading.Event`` (y su lock) si el consumidor indicó que va a dormir;
+    mientras éste trabaja, avisar no toma ningún lock. El consumidor llama a
+    ``clear()`` antes de mirar sus buffers y a ``wait()`` si no encontró
+    trabajo: si algo llegó entre medias, ``pending`` ya está marcado y no
+    duerme, así que no se pierden avisos.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._pending = False  # Lo marcan los productores; sólo lo borra el consumidor
+        self._waiting = False  # El consumidor está (o va a estar) dormido en ``wait``
+
+    def notify(self):
+        """Lado del productor: hay datos nuevos."""
+        self._pending = True
+        if self._waiting:
+            self._event.set()
+
+    def set(self):
+        """Despierta al consumidor aunque no esté esperando (parada, fin de etapa)."""
+        self._pending = True
+        self._event.set()
+
+    def clear(self):
+        """Lado del consumidor: va a mirar los buffers; los avisos anteriores quedan atendidos."""
+        self._pending = False
+
+    def wait(self, timeout=None):
+        """Lado del consumidor: duerme hasta un aviso posterior al último ``clear``."""
+        self._waiting = True
+        try:
+            if not self._pending:
+                self._event.wait(timeout)
+        finally:
+            self._waiting = False
+            self._event.clear()
+
+
+class RingBuffer:
+    """Buffer circular de un productor y un consumidor respaldado por un array fijo.
+
+    El productor (callback de PortAudio) sólo avanza ``_write_pos`` y el
+    consumidor sólo avanza ``_read_pos``; ambos son contadores monótonos, por lo
+    que no hace falta ningún lock. Si el consumidor se retrasa y el buffer se
+    llena, los frames que no caben se descartan y se cuentan en ``overruns``.
+    Si se indica ``notify`` (un ``Wakeup``), cada escritura lo avisa para
+    despertar al consumidor en vez de que éste sondee el buffer.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float32, notify=None):
+        self.capacity = int(capacity)
+        self.channels = int(channels)
+        shape = (self.capacity,) if self.channels == 1 else (self.capacity, self.channels)
+        self._data = np.zeros(shape, dtype=dtype)
+        self._write_pos = 0
+        self._read_pos = 0
+        self.overruns = 0  # Frames descartados por falta de espacio
+        self.notify = notify
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def available(self):
+        """Frames listos para leer."""
+        return self._write_pos - self._read_pos
+
+    def free(self):
+        """Frames que todavía caben sin sobrescribir datos no leídos."""
+        return self.capacity - self.available()
+
+    def write(self, data):
+        """Copia ``data`` al buffer. Devuelve el número de frames escritos."""
+        if self.channels == 1 and data.ndim > 1:
+            data = data[:, 0]
+        frames = len(data)
+        space = self.free()
+        if frames > space:
+            self.overruns += frames - space
+            frames = space
+        if frames == 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        self._data[start:start + first] = data[:first]
+        if first < frames:
+            self._data[:frames - first] = data[first:frames]
+        self._write_pos += frames
+        if self.notify is not None:
+            self.notify.notify()
+        return frames
+
+    def read_into(self, out, frames=None):
+        """Copia hasta ``frames`` frames en ``out``. Devuelve los frames leídos."""
+        frames = min(self.available(), len(out) if frames is None else frames)
+        if frames <= 0:
+            return 0
+
+        start = self._read_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        if first < frames:
+            out[first:frames] = self._data[:frames - first]
+        self._read_pos += frames
+        return frames
+
+    def read(self, frames=None):
+        """Devuelve una copia de hasta ``frames`` frames disponibles."""
+        available = self.available()
+        frames = available if frames is None else min(frames, available)
+        out = np.empty((frames,) + self._data.shape[1:], dtype=self._data.dtype)
+        self.read_into(out, frames)
+        return out
+
+    def clear(self):
+        """Descarta los datos pendientes (sólo desde el consumidor)."""
+        self._read_pos = self._write_pos
+
+
+class ChunkAccumulator:
+    """Acumula audio mono en un array preasignado hasta completar un chunk.
+
+    ``take()`` entrega el chunk como vista del array lleno y pasa a escribir
+    en otro buffer (intercambio de buffers, sin copiar). Cuando el consumidor
+    termina con el chunk lo devuelve con ``recycle()`` para reutilizarlo.
+    Si el corte se hace antes del final, sólo se copia el resto al nuevo
+    buffer, junto con la cola que se repite al inicio del siguiente chunk
+    cuando hay solapamiento.
+    """
+
+    SPARE_BUFFERS = 2
+
+    def __init__(self, frames, dtype=np.float32):
+        self.frames = int(frames)
+        self.dtype = np.dtype(dtype)
+        self._buffer = np.zeros(self.frames, dtype=self.dtype)
+        self._length = 0
+        self._spare = []
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def full(self):
+        return self._length >= self.frames
+
+    @property
+    def data(self):
+        """Vista de lo acumulado en el chunk actual."""
+        return self._buffer[:self._length]
+
+    def fill_from(self, ring):
+        """Lee de ``ring`` lo que quepa en el chunk actual. Devuelve los frames leídos."""
+        got = ring.read_into(self._buffer[self._length:])
+        self._length += got
+        return got
+
+    def take(self, frames=None, keep=0):
+        """Entrega los primeros ``frames`` (todo por defecto) y sigue en otro buffer.
+
+        Las últimas ``keep`` muestras del chunk entregado se conservan al
+        principio del chunk siguiente (solapamiento).
+        """
+        frames = self._length if frames is None else min(int(frames), self._length)
+        keep = min(int(keep), frames)
+        chunk = self._buffer[:frames]
+        buffer = self._spare.pop() if self._spare else np.zeros(self.frames, dtype=self.dtype)
+        length = self._length - frames + keep
+        buffer[:length] = self._buffer[frames - keep:self._length]
+        self._buffer = buffer
+        self._length = length
+        return chunk
+
+    def recycle(self, chunk):
+        """Devuelve un chunk entregado por ``take()`` para reutilizar su memoria.
+
+        Puede llamarse desde el hilo que codificó el chunk: ``append`` y
+        ``pop`` de la lista de reserva son atómicos.
+        """
+        base = chunk if chunk.base is None else chunk.base
+        if len(base) == self.frames and len(self._spare) < self.SPARE_BUFFERS:
+            self._spare.append(base)
@@ -0,0 +1,317 @@
+"""
+Codificación de chunks en memoria: MP3, Opus (OGG), FLAC y WAV.
+
+Todos los códecs comparten la misma interfaz: ``stream()`` devuelve un
+codificador incremental (``write`` de bloques int16 a medida que llegan,
+``finish`` con el archivo completo en bytes) y ``encode()`` codifica un
+chunk entero de una vez. Ninguno pasa por archivos temporales.
+
+MP3 usa lameenc, con pydub (que lanza ffmpeg) sólo como respaldo. Opus y
+FLAC usan libsndfile vía soundfile. Para voz, Opus a 16-32 kbps ocupa 4-8
+veces menos que MP3 a 128 kbps; FLAC es sin pérdidas para archivo.
+"""
+import io
+import logging
+from collections import namedtuple
+
+import numpy as np
+from scipy.io import wavfile
+
+from audio_dsp import PolyphaseResampler
+
+# Importaciones opcionales
+try:
+    import lameenc
+    LAME_AVAILABLE = True
+except ImportError:
+    LAME_AVAILABLE = False
+
+try:
+    from pydub import AudioSegment
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CODECS = ('mp3', 'opus', 'flac', 'wav')
+
+# Chunk codificado listo para enviar: nombre de archivo, bytes y Content-Type
+EncodedChunk = namedtuple('EncodedChunk', ['filename', 'data', 'content_type'])
+
+
+def mp3_bitrate(samplerate):
+    """Bitrate MP3 (kbps) proporcional a la frecuencia del pipeline (128 a 44.1/48 kHz)."""
+    if samplerate >= 32000:
+        return 128
+    if samplerate >= 22050:
+        return 64
+    return 48
+
+
+class AudioCodec:
+    """Códec de chunks mono int16. Las subclases definen el formato y ``stream``."""
+
+    name = ''
+    extension = ''
+    content_type = ''
+
+    def __init__(self, samplerate, bitrate=None):
+        self.samplerate = int(samplerate)
+        self.bitrate = bitrate  # kbps; None = valor por defecto del códec
+
+    @property
+    def available(self):
+        return True
+
+    def stream(self):
+        """Codificador incremental para un chunk nuevo, o None si no lo hay.
+
+        Tiene ``write(samples)``, ``finish()`` (devuelve los bytes) y
+        ``close()`` (lo descarta); ``frames`` cuenta las muestras recibidas.
+        """
+        return None
+
+    def encode(self, samples):
+        """Devuelve el archivo (bytes) de ``samples`` int16 mono, o None si falla."""
+        try:
+            stream = self.stream()
+            if stream is None:
+                return None
+            stream.write(samples)
+            return stream.finish()
+        except Exception as e:
+            logger.error(f"Error codificando {self.name}: {e}")
+            return None
+
+
+class Mp3Stream:
+    """Codificación incremental de un chunk: bloques int16 al entrar, MP3 al cerrar.
+
+    Cada ``write`` codifica sólo el bloque recibido, así que el trabajo se
+    reparte durante la grabación y ``finish`` apenas vacía el codificador.
+    """
+
+    def __init__(self, encoder):
+        self._encoder = encoder
+        self._parts = []
+        self.frames = 0  # Muestras codificadas
+
+    def write(self, samples):
+        """Codifica un bloque int16 mono."""
+        self._parts.append(self._encoder.encode(samples.tobytes()))
+        self.frames += len(samples)
+
+    def finish(self):
+        """Cierra el chunk y devuelve el MP3 completo (bytes)."""
+        self._parts.append(self._encoder.flush())
+        data = b''.join(bytes(part) for part in self._parts)
+        self._parts = []
+        return data
+
+    def close(self):
+        """Descarta el chunk sin terminarlo (p. ej. si era silencio)."""
+        self._parts = []
+
+
+class Mp3Codec(AudioCodec):
+    """MP3 con lameenc en memoria; pydub/ffmpeg sólo si falta lameenc.
+
+    LAME no admite reiniciar un codificador tras ``flush()``, así que cada
+    chunk (un MP3 independiente) usa un ``lameenc.Encoder`` nuevo con esta
+    configuración; crearlo es barato y hace al códec seguro entre hilos.
+    """
+
+    name = 'mp3'
+    extension = '.mp3'
+    content_type = 'audio/mpeg'
+
+    def __init__(self, samplerate, bitrate=None, quality=2):
+        super().__init__(samplerate, bitrate or mp3_bitrate(samplerate))
+        self.quality = quality  # 2 = alta calidad, 7 = rápido
+
+    @property
+    def available(self):
+        return LAME_AVAILABLE or PYDUB_AVAILABLE
+
+    def _lame(self):
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(int(self.bitrate))
+        encoder.set_in_sample_rate(self.samplerate)
+        encoder.set_channels(1)
+        encoder.set_quality(self.quality)
+        return encoder
+
+    def stream(self):
+        return Mp3Stream(self._lame()) if LAME_AVAILABLE else None
+
+    def encode(self, samples):
+        if LAME_AVAILABLE:
+            try:
+                encoder = self._lame()
+                return bytes(encoder.encode(samples.tobytes()) + encoder.flush())
+            except Exception as e:
+                logger.warning(f"lameenc falló, probando pydub: {e}")
+        if PYDUB_AVAILABLE:
+            try:
+                audio = AudioSegment(data=samples.tobytes(), sample_width=2,
+                                     frame_rate=self.samplerate, channels=1)
+                buffer = io.BytesIO()
+                audio.export(buffer, format="mp3", bitrate=f"{self.bitrate}k")
+                return buffer.getvalue()
+            except Exception as e:
+                logger.error(f"Error convirtiendo a MP3: {e}")
+        return None
+
+
+class SoundFileStream:
+    """Codificación incremental con libsndfile sobre un buffer en memoria.
+
+    Si el formato no admite la frecuencia del pipeline, los bloques se
+    resamplean en streaming a ``codec.file_rate``.
+    """
+
+    def __init__(self, codec):
+        self._buffer = io.BytesIO()
+        options = {}
+        if codec.compression_level is not None:
+            options['compression_level'] = codec.compression_level
+        self._file = sf.SoundFile(self._buffer, 'w', codec.file_rate, 1, format=codec.format,
+                                  subtype=codec.subtype, **options)
+        self._resampler = None
+        if codec.file_rate != codec.samplerate:
+            self._resampler = PolyphaseResampler(codec.samplerate, codec.file_rate)
+        self.frames = 0  # Muestras codificadas (a la frecuencia del pipeline)
+
+    def write(self, samples):
+        """Codifica un bloque int16 mono."""
+        self.frames += len(samples)
+        if self._resampler is not None:
+            samples = self._resampler.process(samples * np.float32(1 / 32768))
+        self._file.write(samples)
+
+    def finish(self):
+        """Cierra el chunk y devuelve el archivo completo (bytes)."""
+        self._file.close()
+        return self._buffer.getvalue()
+
+    def close(self):
+        """Descarta el chunk; cierra el archivo antes de liberar su buffer."""
+        self._file.close()
+
+
+class SoundFileCodec(AudioCodec):
+    """Códec sobre libsndfile (``format``/``subtype`` de soundfile)."""
+
+    format = ''
+    subtype = 'PCM_16'
+
+    @property
+    def available(self):
+        return SOUNDFILE_AVAILABLE
+
+    @property
+    def file_rate(self):
+        """Frecuencia del archivo generado."""
+        return self.samplerate
+
+    @property
+    def compression_level(self):
+        return None
+
+    def stream(self):
+        return SoundFileStream(self) if SOUNDFILE_AVAILABLE else None
+
+
+class OpusCodec(SoundFileCodec):
+    """Opus en contenedor OGG, pensado para voz (24 kbps por defecto).
+
+    libsndfile fija el bitrate de Opus con ``compression_level``: 0 equivale
+    a 256 kbps y 1 a 6 kbps, de forma lineal. Opus sólo admite 8, 12, 16, 24
+    y 48 kHz; otras frecuencias se suben a la siguiente admitida.
+    """
+
+    name = 'opus'
+    extension = '.ogg'
+    content_type = 'audio/ogg'
+    format = 'OGG'
+    subtype = 'OPUS'
+    RATES = (8000, 12000, 16000, 24000, 48000)
+
+    def __init__(self, samplerate, bitrate=None):
+        super().__init__(samplerate, bitrate or 24)
+
+    @property
+    def file_rate(self):
+        return next(rate for rate in self.RATES if rate >= min(self.samplerate, self.RATES[-1]))
+
+    @property
+    def compression_level(self):
+        return float(np.clip((256 - self.bitrate) / 250, 0.0, 1.0))
+
+
+class FlacCodec(SoundFileCodec):
+    """FLAC de 16 bits, sin pérdidas (``bitrate`` no aplica)."""
+
+    name = 'flac'
+    extension = '.flac'
+    content_type = 'audio/flac'
+    format = 'FLAC'
+
+
+class WavStream:
+    """Acumula bloques int16 y escribe el WAV al cerrar (sin compresión)."""
+
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self._parts = []
+        self.frames = 0
+
+    def write(self, samples):
+        self._parts.append(samples)
+        self.frames += len(samples)
+
+    def finish(self):
+        buffer = io.BytesIO()
+        samples = np.concatenate(self._parts) if self._parts else np.zeros(0, dtype=np.int16)
+        wavfile.write(buffer, self.samplerate, samples)
+        self._parts = []
+        return buffer.getvalue()
+
+    def close(self):
+        self._parts = []
+
+
+class WavCodec(AudioCodec):
+    """WAV PCM 16 bits: sin dependencias, unos 10 MB por minuto a 44.1 kHz."""
+
+    name = 'wav'
+    extension = '.wav'
+    content_type = 'audio/wav'
+
+    def stream(self):
+        return WavStream(self.samplerate)
+
+
+_CODEC_CLASSES = {'mp3': Mp3Codec, 'opus': OpusCodec, 'flac': FlacCodec, 'wav': WavCodec}
+
+
+def create_codec(name, samplerate, bitrate=None):
+    """Crea el códec ``name``; si no existe o falta su librería, MP3 y luego WAV."""
+    if name not in _CODEC_CLASSES:
+        logger.warning(f"Códec desconocido '{name}', usando MP3")
+        name = 'mp3'
+    codec = _CODEC_CLASSES[name](samplerate, bitrate)
+    if not codec.available:
+        fallback = Mp3Codec(samplerate) if name != 'mp3' else None
+        if fallback is None or not fallback.available:
+            fallback = WavCodec(samplerate)
+        logger.warning(f"Códec {name} no disponible, usando {fallback.name}")
+        codec = fallback
+    return codec
@@ -0,0 +1,411 @@
+"""
+Etapas DSP vectorizadas del pipeline de captura.
+Se ejecutan fuera del callback de PortAudio, sobre lotes grandes de frames.
+"""
+from fractions import Fraction
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy.signal import firwin, kaiser_beta
+
+
+def to_float32(block):
+    """Convierte un bloque PCM a float32 en el rango [-1, 1)."""
+    if block.dtype == np.float32:
+        return block
+    if np.issubdtype(block.dtype, np.integer):
+        scale = 1.0 / (np.iinfo(block.dtype).max + 1)
+        return block.astype(np.float32) * np.float32(scale)
+    return block.astype(np.float32)
+
+
+def to_int16(block):
+    """Convierte un bloque float32 en [-1, 1] a PCM int16."""
+    return (block * 32767).astype(np.int16)
+
+
+def downmix(block):
+    """Mezcla un bloque (frames, canales) a mono promediando canales."""
+    if block.ndim == 1:
+        return block
+    if block.shape[1] == 1:
+        return block[:, 0]
+    return block.mean(axis=1, dtype=np.float32)
+
+
+class PolyphaseResampler:
+    """Resampleo racional en streaming con filtro polifásico limitado en banda.
+
+    Conserva entre bloques las últimas muestras de entrada (estado del filtro) y
+    el índice absoluto de la siguiente muestra de salida (fase fraccional), de
+    modo que la concatenación de las salidas es idéntica a resamplear la señal
+    completa de una vez: no hay saltos en los bordes de bloque ni deriva.
+
+    El filtro es un paso bajo Kaiser con ``attenuation_db`` de rechazo cuya
+    banda eliminada empieza justo en el Nyquist más restrictivo, así que no
+    deja pasar alias. El resultado equivale a ``upfirdn`` con ese filtro, pero
+    se calcula por ciclos de ``down`` muestras de entrada: las fases de salida
+    se agrupan de forma que la ventana de cada grupo cabe en un ciclo, y cada
+    grupo es un único producto de matrices (BLAS) sobre una vista de la
+    entrada, sin copiarla.
+    """
+
+    def __init__(self, in_rate, out_rate, zero_crossings=16, attenuation_db=80.0):
+        ratio = Fraction(int(out_rate), int(in_rate))
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self._in_count = 0   # Muestras de entrada consumidas
+        self._out_count = 0  # Índice absoluto de la siguiente muestra de salida
+        self._history = np.zeros(0, dtype=np.float32)
+        self._start = 0      # Índice absoluto de la primera muestra de ``_history``
+        if self.up == self.down:
+            self._num_taps = 1
+            return
+
+        # Prototipo paso bajo: la banda de transición de la ventana Kaiser
+        # termina en el Nyquist más restrictivo (1/factor)
+        factor = max(self.up, self.down)
+        num_taps = 2 * zero_crossings * factor + 1
+        width = (attenuation_db - 7.95) / (2.285 * np.pi * (num_taps - 1))
+        beta = kaiser_beta(attenuation_db)
+        taps = firwin(num_taps, 1.0 / factor - width / 2, window=('kaiser', beta)) * self.up
+        self._num_taps = num_taps
+
+        # Varios ciclos juntos si ``down`` es pequeño, para que las ventanas quepan
+        taps_per_phase = -(-num_taps // self.up)
+        cycles = max(1, -(-2 * taps_per_phase // self.down))
+        self._cycle_out = self.up * cycles
+        self._cycle_in = self.down * cycles
+        # Fases por grupo: su ventana ocupa como mucho el doble de los taps de una fase
+        group = max(1, min(self._cycle_out, taps_per_phase * self.up // self.down))
+        self._groups = []
+        for first in range(0, self._cycle_out, group):
+            phases = range(first, min(first + group, self._cycle_out))
+            # La salida n = c * cycle_out + r usa y[n] = sum_q h[r*down - q*up] x[c * cycle_in + q]
+            q_min = min((r * self.down - num_taps) // self.up + 1 for r in phases)
+            q_max = max(r * self.down // self.up for r in phases)
+            matrix = np.zeros((q_max - q_min + 1, len(phases)), dtype=np.float32)
+            for column, r in enumerate(phases):
+                q = np.arange(q_min, q_max + 1)
+                t = r * self.down - q * self.up
+                valid = (t >= 0) & (t < num_taps)
+                matrix[valid, column] = taps[t[valid]]
+            self._groups.append((phases.start, phases.stop, q_min, matrix))
+        self._q_min = min(q_min for _, _, q_min, _ in self._groups)
+        self._q_end = max(q_min + len(matrix) for _, _, q_min, matrix in self._groups)
+
+    @property
+    def delay(self):
+        """Retardo de grupo del filtro en segundos."""
+        return (self._num_taps - 1) / 2.0 / (self.in_rate * self.up)
+
+    @property
+    def output_count(self):
+        """Muestras de salida producidas desde el inicio."""
+        return self._out_count
+
+    def process(self, data):
+        """Resamplea un bloque mono float32 y devuelve las muestras de salida listas."""
+        data = np.asarray(data, dtype=np.float32)
+        if self.up == self.down:
+            self._in_count += len(data)
+            self._out_count += len(data)
+            return data
+
+        buf = np.concatenate((self._history, data))
+        self._in_count += len(data)
+        out_end = (self._in_count * self.up - 1) // self.down + 1
+        if out_end <= self._out_count:
+            self._history = buf
+            return np.zeros(0, dtype=np.float32)
+
+        # Ciclos completos que cubren las salidas pendientes; la entrada que
+        # falta a los lados (antes del inicio o aún no recibida) cuenta como cero
+        first = self._out_count // self._cycle_out
+        cycles = -(-out_end // self._cycle_out) - first
+        lo = first * self._cycle_in + self._q_min
+        hi = (first + cycles - 1) * self._cycle_in + self._q_end
+        end = self._start + len(buf)
+        window = buf[max(lo - self._start, 0):hi - self._start]
+        if lo < self._start or hi > end:
+            window = np.concatenate((np.zeros(max(self._start - lo, 0), dtype=np.float32), window,
+                                     np.zeros(max(hi - end, 0), dtype=np.float32)))
+
+        out = np.empty((cycles, self._cycle_out), dtype=np.float32)
+        stride = window.strides[0]
+        for phase_start, phase_stop, q_min, matrix in self._groups:
+            rows = as_strided(window[q_min - self._q_min:], shape=(cycles, len(matrix)),
+                              strides=(self._cycle_in * stride, stride), writeable=False)
+            out[:, phase_start:phase_stop] = rows @ matrix
+        offset = first * self._cycle_out
+        out = out.ravel()[self._out_count - offset:out_end - offset]
+        self._out_count = out_end
+
+        # Conservar la entrada desde el ciclo de la próxima salida
+        keep = self._out_count // self._cycle_out * self._cycle_in + self._q_min
+        if keep > self._start:
+            buf = buf[keep - self._start:]
+            self._start = keep
+        self._history = buf
+        return out
+
+
+class DriftEstimator:
+    """Estima la frecuencia real de un stream a partir de sus timestamps ADC.
+
+    Ajusta por mínimos cuadrados, con olvido exponencial, la recta
+    ``frame = f0 + rate * (t - t0)`` con los pares (frame, instante ADC) de
+    cada bloque del callback. La pendiente es la frecuencia efectiva del reloj
+    del dispositivo medida en el reloj de PortAudio.
+    """
+
+    def __init__(self, nominal_rate, time_constant=60.0, min_span=2.0):
+        self.nominal_rate = float(nominal_rate)
+        self.time_constant = time_constant
+        self.min_span = min_span
+        self._origin = None
+        self._last_t = 0.0
+        self._sw = self._st = self._sf = self._stt = self._stf = 0.0
+
+    @property
+    def ready(self):
+        """True cuando hay timestamps suficientes para estimar la pendiente."""
+        if self._sw < 2:
+            return False
+        var = self._stt / self._sw - (self._st / self._sw) ** 2
+        return var * 12 >= self.min_span ** 2  # varianza de una rampa uniforme
+
+    @property
+    def rate(self):
+        """Frames por segundo medidos (la nominal mientras no haya datos)."""
+        if not self.ready:
+            return self.nominal_rate
+        var = self._sw * self._stt - self._st * self._st
+        cov = self._sw * self._stf - self._st * self._sf
+        return cov / var
+
+    @property
+    def drift_ppm(self):
+        return (self.rate / self.nominal_rate - 1.0) * 1e6
+
+    def update(self, frame, timestamp):
+        """Añade el instante ADC ``timestamp`` del frame absoluto ``frame``."""
+        if self._origin is None:
+            self._origin = (frame, timestamp)
+        t = timestamp - self._origin[1]
+        f = float(frame - self._origin[0])
+        if t > self._last_t:
+            decay = np.exp(-(t - self._last_t) / self.time_constant)
+            self._sw *= decay
+            self._st *= decay
+            self._sf *= decay
+            self._stt *= decay
+            self._stf *= decay
+            self._last_t = t
+        self._sw += 1.0
+        self._st += t
+        self._sf += f
+        self._stt += t * t
+        self._stf += t * f
+
+    def time_of(self, frame):
+        """Instante estimado del frame absoluto ``frame`` (None sin timestamps)."""
+        if self._origin is None:
+            return None
+        t_mean = self._st / self._sw
+        f_mean = self._sf / self._sw
+        return self._origin[1] + t_mean + (frame - self._origin[0] - f_mean) / self.rate
+
+    def frame_at(self, timestamp):
+        """Frame absoluto (fraccional) estimado para el instante ``timestamp``."""
+        if self._origin is None:
+            return None
+        t_mean = self._st / self._sw
+        f_mean = self._sf / self._sw
+        return self._origin[0] + f_mean + (timestamp - self._origin[1] - t_mean) * self.rate
+
+
+class FractionalResampler:
+    """Resampler de razón variable cercana a 1 para compensar deriva de reloj.
+
+    Interpolación cúbica (Catmull-Rom) con fase continua entre bloques; la
+    razón salida/entrada puede cambiarse en cualquier momento vía ``ratio``.
+    """
+
+    def __init__(self, ratio=1.0):
+        self.ratio = ratio
+        self._history = np.zeros(3, dtype=np.float32)
+        self._phase = 3.0  # Posición de la siguiente salida dentro de history+bloque
+
+    def process(self, data):
+        """Resamplea un bloque mono float32 con la razón actual."""
+        buf = np.concatenate((self._history, np.asarray(data, dtype=np.float32)))
+        step = 1.0 / self.ratio
+        limit = len(buf) - 2  # Se necesitan x[i-1] .. x[i+2]
+        count = int(np.ceil((limit - self._phase) / step)) if limit > self._phase else 0
+        out = np.zeros(0, dtype=np.float32)
+        if count > 0:
+            pos = self._phase + step * np.arange(count)
+            index = pos.astype(np.int64)
+            frac = (pos - index).astype(np.float32)
+            xm1, x0, x1, x2 = buf[index - 1], buf[index], buf[index + 1], buf[index + 2]
+            out = x0 + 0.5 * frac * (x1 - xm1 + frac * (2.0 * xm1 - 5.0 * x0 + 4.0 * x1 - x2
+                                                       + frac * (3.0 * (x0 - x1) + x2 - xm1)))
+            self._phase = pos[-1] + step
+        self._phase -= len(buf) - 3
+        self._history = buf[-3:]
+        return out
+
+
+class AutomaticGainControl:
+    """Control automático de ganancia con limitador, en streaming por bloques.
+
+    Mide el RMS y el pico de tramas de ``frame_ms`` y sigue el RMS con una
+    envolvente de ataque rápido y relajación ``envelope_release``. La
+    ganancia lleva la envolvente a ``target_db`` (como mucho ``max_gain_db``),
+    baja en ``attack`` segundos y sube en ``release``, y se interpola por
+    muestra dentro de cada trama. Por debajo de ``gate_db`` vuelve a la
+    unidad para no amplificar ruido ni silencios. El limitador recorta la
+    ganancia sólo en las tramas cuyo pico superaría ``ceiling_db``, así que
+    un golpe aislado no baja el nivel del resto. El estado se conserva entre
+    bloques: el nivel no salta en los cortes de chunk.
+    """
+
+    def __init__(self, samplerate, target_db=-20.0, max_gain_db=20.0, gate_db=-40.0,
+                 ceiling_db=-2.0, attack=0.05, release=1.0, envelope_release=0.3, frame_ms=10.0):
+        self.frame = max(int(samplerate * frame_ms / 1000), 1)
+        seconds = self.frame / samplerate
+        self._attack = 1.0 - np.exp(-seconds / attack)
+        self._release = 1.0 - np.exp(-seconds / release)
+        self._envelope_attack = 1.0 - np.exp(-seconds / 0.01)
+        self._envelope_release = 1.0 - np.exp(-seconds / envelope_release)
+        self.target = 10.0 ** (target_db / 20)
+        self.max_gain = 10.0 ** (max_gain_db / 20)
+        self.gate = 10.0 ** (gate_db / 20)
+        self.ceiling = 10.0 ** (ceiling_db / 20)
+        self.envelope = 0.0  # RMS suavizado
+        self.gain = 1.0      # Ganancia suavizada, sin limitar
+        self._applied = 1.0  # Ganancia aplicada al final del último bloque
+
+    @property
+    def gain_db(self):
+        return 20.0 * np.log10(self.gain)
+
+    def process(self, block):
+        """Aplica la ganancia a ``block`` (float32 mono) en el sitio y lo devuelve."""
+        length = len(block)
+        if not length:
+            return block
+        starts = np.arange(0, length, self.frame)
+        sizes = np.diff(np.append(starts, length))
+        rms = np.sqrt(np.add.reduceat(block * block, starts) / sizes)
+        peaks = np.maximum.reduceat(np.abs(block), starts)
+
+        # Recursión por trama (pocas iteraciones: una cada ``frame_ms``)
+        gains = np.empty(len(starts) + 1, dtype=np.float32)
+        gains[0] = self._applied
+        envelope, gain = self.envelope, self.gain
+        for index, (level, peak) in enumerate(zip(rms.tolist(), peaks.tolist()), 1):
+            rate = self._envelope_attack if level > envelope else self._envelope_release
+            envelope += rate * (level - envelope)
+            target = min(self.target / envelope, self.max_gain) if envelope > self.gate else 1.0
+            gain += (self._attack if target < gain else self._release) * (target - gain)
+            gains[index] = min(gain, self.ceiling / peak) if peak > 0 else gain
+        self.envelope, self.gain, self._applied = envelope, gain, float(gains[-1])
+
+        # Rampa lineal dentro de cada trama; las bajadas se aplican desde su
+        # inicio para que ninguna muestra supere el techo del limitador
+        begin = np.minimum(gains[:-1], gains[1:])
+        step = (gains[1:] - begin) / sizes
+        offset = np.arange(length, dtype=np.float32) - np.repeat(starts, sizes)
+        block *= np.repeat(begin, sizes) + np.repeat(step, sizes) * offset
+        return block
+
+
+class Mixer:
+    """Mezcla N pistas alineadas con sus ganancias en una sola pasada.
+
+    Las pistas se copian a filas de una matriz preasignada y la mezcla es un
+    único producto ``gains @ matrix`` sobre un buffer de salida también
+    preasignado, sin listas ni arrays temporales por fuente. Con ``agc`` el
+    control de ganancia se aplica a cada bloque mezclado antes de escribirlo.
+    """
+
+    def __init__(self, gains, block_frames, agc=None):
+        self.gains = np.asarray(gains, dtype=np.float32)
+        self.block_frames = int(block_frames)
+        self.agc = agc
+        self._matrix = np.zeros((len(self.gains), self.block_frames), dtype=np.float32)
+        self._out = np.zeros(self.block_frames, dtype=np.float32)
+
+    def mix(self, inputs, output, flush=False):
+        """Mezcla de ``inputs`` (RingBuffers) a ``output``. Devuelve los frames mezclados.
+
+        Normalmente sólo se mezcla lo disponible en todas las pistas; con
+        ``flush`` se mezcla lo que haya y las pistas más cortas se rellenan
+        con silencio (al terminar la grabación).
+        """
+        if not inputs:
+            return 0
+        available = [buffer.available() for buffer in inputs]
+        frames = max(available) if flush else min(available)
+        frames = min(frames, self.block_frames, output.free())
+        if frames <= 0:
+            return 0
+
+        for row, buffer in zip(self._matrix, inputs):
+            got = buffer.read_into(row, frames)
+            row[got:frames] = 0.0
+        out = self._out[:frames]
+        np.dot(self.gains, self._matrix[:, :frames], out=out)
+        if self.agc is not None:
+            self.agc.process(out)
+        output.write(out)
+        return frames
+
+
+class VoiceActivityDetector:
+    """VAD por energía y cruces por cero, vectorizado por tramas de ``frame_ms``.
+
+    Una trama es voz si su energía supera el ruido de fondo en
+    ``threshold_db``, o en la mitad de eso con una tasa de cruces por cero
+    alta (fricativas). El ruido de fondo baja de inmediato y sube despacio,
+    ``floor_rise_db`` por segundo analizado.
+    """
+
+    def __init__(self, samplerate, frame_ms=20.0, threshold_db=12.0, zcr_threshold=0.3,
+                 floor_rise_db=1.0, min_floor_db=-80.0):
+        self.samplerate = samplerate
+        self.frame = max(int(samplerate * frame_ms / 1000), 2)
+        self.threshold_db = threshold_db
+        self.zcr_threshold = zcr_threshold
+        self.floor_rise_db = floor_rise_db
+        self.min_floor_db = min_floor_db
+        self.noise_floor_db = None
+
+    def features(self, samples):
+        """Energía (dB) y tasa de cruces por cero de cada trama completa."""
+        count = len(samples) // self.frame
+        frames = samples[:count * self.frame].reshape(count, self.frame)
+        power = np.einsum('ij,ij->i', frames, frames) / self.frame
+        energy_db = 10.0 * np.log10(power + 1e-12)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame - 1)
+        return energy_db, zcr
+
+    def classify(self, samples):
+        """Energía por trama y máscara booleana de voz; actualiza el ruido de fondo."""
+        energy_db, zcr = self.features(samples)
+        if len(energy_db):
+            quiet = max(float(np.percentile(energy_db, 10)), self.min_floor_db)
+            if self.noise_floor_db is None:
+                self.noise_floor_db = quiet
+            else:
+                rise = self.floor_rise_db * len(energy_db) * self.frame / self.samplerate
+                self.noise_floor_db = min(quiet, self.noise_floor_db + rise)
+        floor = self.noise_floor_db if self.noise_floor_db is not None else self.min_floor_db
+        speech = (energy_db > floor + self.threshold_db) | (
+            (energy_db > floor + self.threshold_db / 2) & (zcr > self.zcr_threshold))
+        return energy_db, speech
@@ -2,36 +2,18 @@
 AudioRecorder simplificado y corregido para grabación simultánea de micrófono y sistema.
 Versión optimizada que soluciona los problemas de overflow y sincronización.
 """
-import os
 import sys
 import time
 import logging
 import threading
+import uuid
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-import queue
 
 # Importaciones de PySide6
 from PySide6.QtCore import QThread, Signal
 
-# Importaciones de audio
-import sounddevice as sd
-from scipy.io import wavfile
-
-# Importaciones opcionales
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
-
-try:
-    import lameenc
-    LAME_AVAILABLE = True
-except ImportError:
-    LAME_AVAILABLE = False
-
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -45,14 +27,206 @@ logger = logging.getLogger(__name__)
 
 # Importaciones locales
 try:
-    from utils import send_to_webhook, load_config
+    from utils import load_config, WebhookClient
 except ImportError:
     logger.warning("No se pudo importar módulos locales")
-    def send_to_webhook(*args, **kwargs):
-        return False, "Webhook no disponible"
+    class WebhookClient:
+        def __init__(self, *args, **kwargs):
+            pass
+        def send(self, *args, **kwargs):
+            return False, "Webhook no disponible"
+        def close(self):
+            pass
     def load_config():
         return {}
 
+from audio_buffer import RingBuffer, ChunkAccumulator, Wakeup
+from stream_cache import StreamConfigCache
+from capture_sources import CaptureSource, SoundDeviceSource, SharedDeviceSource
+from capture_stats import CaptureStats
+from encode_pool import EncodePool
+from upload_queue import UploadQueue
+from upload_spool import UploadSpool
+from audio_codecs import EncodedChunk, WavCodec, create_codec
+from chunking import CHUNK_MODES, SILENCE_POLICIES, ChunkBoundaryDetector, SilenceClassifier
+from audio_dsp import (
+    to_float32, to_int16, downmix, PolyphaseResampler, DriftEstimator, FractionalResampler, Mixer,
+    AutomaticGainControl
+)
+
+# Frecuencias de pipeline admitidas; 16 kHz basta para transcripción de voz
+DEFAULT_SAMPLE_RATE = 44100
+SUPPORTED_SAMPLE_RATES = (16000, 22050, 24000, 32000, 44100, 48000)
+
+
+class CaptureTrack:
+    """Una fuente de captura: buffer crudo del callback y etapa DSP hacia el pipeline."""
+
+    STAMP_CAPACITY = 4096  # Timestamps de bloque pendientes de procesar
+
+    def __init__(self, name, samplerate, buffer_seconds, source=None, gain=1.0, notify=None):
+        self.name = name
+        self.source = source  # CaptureSource que alimenta la pista
+        self.gain = gain      # Peso de la pista en la mezcla
+        self.notify = notify  # Wakeup que despierta a la etapa DSP en cada bloque
+        self.samplerate = samplerate  # Frecuencia del pipeline
+        self.buffer_seconds = buffer_seconds
+        self.device_rate = samplerate
+        self.raw = None  # Se crea al abrir el stream, con sus canales y dtype
+        self.resampler = None
+        self.output = RingBuffer(samplerate * buffer_seconds)
+        self.stats = CaptureStats()  # Contadores de salud escritos por el callback
+        self.max_correction = 0.005  # Corrección de razón máxima (0.5%)
+        self.settle_seconds = 5.0    # Tiempo para absorber un error de alineación
+        self.resync_seconds = 0.05   # Errores mayores se corrigen de golpe
+        self._reset_timing()
+
+    def _reset_timing(self):
+        self.frames_captured = 0   # Frames entregados por el dispositivo (callback)
+        self.frames_processed = 0  # Frames consumidos por la etapa DSP
+        self.written = 0           # Muestras escritas en ``output`` (incluye relleno)
+        self.alignment_error = 0.0
+        self.drift = DriftEstimator(self.device_rate)
+        self.fractional = FractionalResampler()
+        self._aligned = False
+        self._skip = 0
+        self._stamp_frames = np.zeros(self.STAMP_CAPACITY, dtype=np.int64)
+        self._stamp_times = np.zeros(self.STAMP_CAPACITY, dtype=np.float64)
+        self._stamp_count = 0
+        self._stamp_read = 0
+        self.stats.reset()
+
+    def open(self, channels, dtype, device_rate):
+        """Prepara el buffer crudo para un stream con el formato indicado."""
+        self.device_rate = device_rate
+        self.raw = RingBuffer(int(device_rate * self.buffer_seconds), channels, dtype, self.notify)
+        self.resampler = PolyphaseResampler(device_rate, self.samplerate)
+        self._reset_timing()
+
+    def capture(self, indata, time_info, status=None):
+        """Llamado desde el callback: copia el bloque y registra su instante ADC.
+
+        ``status`` son los flags de PortAudio; se cuentan en ``stats`` en vez
+        de registrarse en el log desde el hilo de tiempo real.
+        """
+        start = time.perf_counter()
+        slot = self._stamp_count % self.STAMP_CAPACITY
+        self._stamp_frames[slot] = self.frames_captured
+        self._stamp_times[slot] = time_info.inputBufferAdcTime or time_info.currentTime
+        self._stamp_count += 1
+        self.frames_captured += len(indata)
+        written = self.raw.write(indata)
+        self.stats.record(status, time.perf_counter() - start, len(indata) - written,
+                          self.raw.available(), len(indata))
+
+    def _consume_stamps(self):
+        """Alimenta el estimador de deriva con los timestamps nuevos."""
+        end = self._stamp_count
+        start = max(self._stamp_read, end - self.STAMP_CAPACITY)
+        for i in range(start, end):
+            slot = i % self.STAMP_CAPACITY
+            if self._stamp_times[slot] > 0:
+                self.drift.update(int(self._stamp_frames[slot]), float(self._stamp_times[slot]))
+        self._stamp_read = end
+
+    def pipeline_time(self, index):
+        """Instante de captura de la muestra ``index`` del pipeline de esta pista."""
+        frame = index * self.device_rate / self.samplerate
+        return self.drift.time_of(frame) + self.resampler.delay
+
+    def pipeline_index(self, timestamp):
+        """Posición en el pipeline de esta pista correspondiente a ``timestamp``."""
+        frame = self.drift.frame_at(timestamp - self.resampler.delay)
+        return frame * self.samplerate / self.device_rate
+
+    def process(self, min_frames=1, reference=None):
+        """Convierte, mezcla a mono y resamplea lo acumulado en el buffer crudo.
+
+        Si se indica ``reference``, la salida se alinea con esa pista: se
+        compensa el desfase inicial y la deriva entre relojes con el
+        resampler fraccional. Nunca se lee más de lo que cabe en la salida;
+        lo que no quepa espera en el buffer crudo.
+        """
+        raw = self.raw
+        if raw is None or raw.available() < max(min_frames, 1):
+            return 0
+        self._consume_stamps()
+        if reference is not None and (reference.drift.time_of(0) is None or
+                                      self.drift.time_of(0) is None):
+            return 0  # Sin timestamps todavía no se puede alinear
+
+        # Margen para la corrección de deriva y el relleno de alineación
+        margin = self.resync_seconds * self.samplerate
+        room = self.output.free() * (1.0 - 2 * self.max_correction) - margin
+        frames = min(raw.available(), int(room * self.device_rate / self.samplerate))
+        if frames < max(min_frames, 1):
+            return 0
+        block = raw.read(frames)
+        mono = self.resampler.process(downmix(to_float32(block)))
+        self.frames_processed += len(block)
+        if reference is not None:
+            mono = self._align(mono, reference)
+        self.written += self.output.write(mono)
+        return len(block)
+
+    def _align(self, mono, reference):
+        """Aplica desfase y corrección de deriva respecto a ``reference``."""
+        clock_ratio = ((reference.drift.rate / reference.device_rate) /
+                       (self.drift.rate / self.device_rate))
+
+        # Posición en la que acabaría este bloque frente a la que le corresponde
+        # en la línea de tiempo de la referencia
+        expected = reference.pipeline_index(self.pipeline_time(self.resampler.output_count))
+        usable = len(mono) - self._skip
+        error = self.written + usable * clock_ratio - expected
+
+        if not self._aligned or abs(error) > self.resync_seconds * self.samplerate:
+            # Alineación inicial o resincronización tras pérdida de datos
+            offset = int(round(error))
+            if offset < 0:
+                self.written += self.output.write(np.zeros(-offset, dtype=np.float32))
+            else:
+                self._skip += offset
+                usable -= offset
+            error -= offset
+            self._aligned = True
+
+        if self._skip:
+            dropped = min(self._skip, len(mono))
+            mono = mono[dropped:]
+            self._skip -= dropped
+
+        # Corrección proporcional repartida en al menos ``settle_seconds``
+        correction = 0.0
+        if usable > 0:
+            correction = -error / max(self.settle_seconds * self.samplerate, usable)
+            limit = self.max_correction * clock_ratio
+            correction = max(-limit, min(limit, correction))
+            error += usable * correction
+        self.fractional.ratio = clock_ratio + correction
+        self.alignment_error = error
+        return self.fractional.process(mono)
+
+    def health(self):
+        """Contadores de salud de la captura y profundidad actual de las colas."""
+        health = self.stats.snapshot()
+        blocks = health['blocks']
+        health['block_ms'] = round(self.stats.frames / blocks / self.device_rate * 1000, 3) if blocks else 0.0
+        health['max_depth_seconds'] = round(health.pop('max_depth_frames') / self.device_rate, 3)
+        health['raw_depth_seconds'] = round(self.raw.available() / self.device_rate, 3) if self.raw else 0.0
+        health['output_depth_seconds'] = round(self.output.available() / self.samplerate, 3)
+        health['output_overruns'] = self.output.overruns
+        return health
+
+    def metrics(self):
+        """Estado de alineación y deriva de la pista."""
+        return {
+            'alignment_error_samples': round(float(self.alignment_error), 2),
+            'drift_ppm': round(float(self.drift.drift_ppm), 2),
+            'ratio': float(self.fractional.ratio),
+        }
+
+
 class AudioRecorder(QThread):
     """Grabador de audio simplificado y optimizado."""
     
@@ -62,33 +236,214 @@ class AudioRecorder(QThread):
     error_occurred = Signal(str)
     status_update = Signal(str)
     finished_sending = Signal(bool, str)
+    health_update = Signal(dict)  # Resumen periódico de get_health_stats()
+
+    def __init__(self, mic_index=None, sys_index=None, webhook_url=None, chunk_duration=4, sources=None,
+                 sample_rate=DEFAULT_SAMPLE_RATE, chunk_mode='fixed', chunk_min_duration=None,
+                 chunk_max_duration=None, silence_policy='send', silence_threshold_db=-50.0,
+                 chunk_overlap=0.0, encode_workers=2, codec='mp3', codec_bitrate=None,
+                 upload_pool_size=2, upload_keep_alive=True, upload_connect_timeout=3.05,
+                 upload_read_timeout=10.0, upload_read_timeout_per_mb=10.0, upload_workers=1,
+                 upload_queue_size=8, upload_policy='block', upload_drain_timeout=30.0, spool=None,
+                 strict_ordering=False):
+        """``mic_index`` y ``sys_index`` aceptan un índice de dispositivo o una CaptureSource.
+
+        Para más de dos fuentes se usa ``sources``: una lista de dicts con
+        ``device`` (índice o CaptureSource), ``kind`` ('input' o 'loopback'),
+        ``gain`` y opcionalmente ``name`` y ``channels`` (canales del
+        dispositivo que usa la fuente). Si se indica, sustituye a
+        ``mic_index``/``sys_index``. Las fuentes sobre el mismo dispositivo
+        comparten un único stream.
+
+        ``sample_rate`` es la frecuencia del pipeline (chunks, codificación y
+        envío); cada dispositivo se abre a su frecuencia nativa y se convierte
+        una sola vez a ésta.
 
-    def __init__(self, mic_index=None, sys_index=None, webhook_url=None, chunk_duration=4):
+        Con ``chunk_mode='vad'`` los chunks se cortan en la primera pausa de
+        voz entre ``chunk_min_duration`` y ``chunk_max_duration`` segundos
+        (por defecto la mitad y 1.5 veces ``chunk_duration``).
+
+        ``silence_policy`` decide qué hacer con los chunks silenciosos (por
+        debajo de ``silence_threshold_db`` dBFS): 'send' los envía igual,
+        'marker' envía sólo un marcador sin audio y 'skip' no envía nada. En
+        todos los casos cada envío lleva su posición en la grabación.
+
+        ``chunk_overlap`` repite al inicio de cada chunk esos segundos del
+        final del anterior (como mucho la mitad del chunk mínimo); el envío
+        indica el solapamiento para que el destino lo descarte.
+
+        ``encode_workers`` hilos codifican los chunks fuera del hilo que
+        corta; los envíos salen igualmente en orden de chunk.
+
+        ``codec`` es el formato de los chunks ('mp3', 'opus', 'flac' o
+        'wav') y ``codec_bitrate`` su bitrate en kbps (por defecto el del
+        códec: MP3 según la frecuencia, Opus 24 kbps).
+
+        Los envíos de una grabación comparten una sesión HTTP con conexiones
+        persistentes (``upload_pool_size`` por host, ``upload_keep_alive``).
+        ``upload_connect_timeout`` limita la conexión y el timeout de lectura
+        es ``upload_read_timeout`` más ``upload_read_timeout_per_mb`` segundos
+        por MB del chunk.
+
+        ``upload_workers`` hilos envían los chunks (con uno solo llegan en
+        orden) desde una cola de ``upload_queue_size`` chunks. Si el webhook
+        no da abasto y la cola se llena, ``upload_policy`` decide: 'block'
+        frena la codificación, 'spill' guarda el chunk nuevo en disco y
+        'drop_oldest' descarta el más antiguo sin enviar. Al detener se
+        esperan hasta ``upload_drain_timeout`` segundos a los envíos
+        pendientes; los que no salen a tiempo se guardan en disco.
+
+        Los chunks que no se envían (fallo, 'spill' o fin de la espera) van a
+        ``spool``, un UploadSpool persistente desde el que se reintentan (por
+        defecto el de *temp_audio/spool/*).
+
+        Cada envío lleva el UUID de la grabación, un número de secuencia
+        consecutivo y la hora de captura del chunk. Con ``strict_ordering``
+        ningún chunk llega antes que los anteriores: cada envío espera a que
+        se confirme el previo (los envíos no se solapan aunque haya varios
+        ``upload_workers``; la codificación y la cola siguen trabajando en
+        paralelo), y tras un fallo o un 'spill' los chunks siguientes pasan
+        al spool detrás del primero, que los reenvía en orden de secuencia.
+        En este modo 'drop_oldest' se sustituye por 'block', y lo que quede
+        sin enviar al detener no se reenvía hasta que termine el envío en
+        curso.
+        """
         super().__init__()
         self.mic_index = mic_index
         self.sys_index = sys_index
         self.webhook_url = webhook_url
         self.chunk_duration = max(chunk_duration, 2)  # Mínimo 2 segundos
+        if chunk_mode not in CHUNK_MODES:
+            logger.warning(f"Modo de chunk desconocido '{chunk_mode}', usando 'fixed'")
+            chunk_mode = 'fixed'
+        self.chunk_mode = chunk_mode
+        self.chunk_min_duration = max(chunk_min_duration or self.chunk_duration / 2, 1)
+        self.chunk_max_duration = max(chunk_max_duration or self.chunk_duration * 1.5,
+                                      self.chunk_min_duration + 1)
+        if silence_policy not in SILENCE_POLICIES:
+            logger.warning(f"Política de silencio desconocida '{silence_policy}', usando 'send'")
+            silence_policy = 'send'
+        self.silence_policy = silence_policy
+        self.silence_threshold_db = silence_threshold_db
+        shortest = self.chunk_min_duration if chunk_mode == 'vad' else self.chunk_duration
+        self.chunk_overlap = min(max(float(chunk_overlap or 0.0), 0.0), shortest / 2)
+        self.encode_workers = max(int(encode_workers), 1)
+        self.encoder = None  # EncodePool de la grabación en curso
+        self.upload_options = {
+            'pool_size': upload_pool_size,
+            'keep_alive': upload_keep_alive,
+            'connect_timeout': upload_connect_timeout,
+            'read_timeout': upload_read_timeout,
+            'read_timeout_per_mb': upload_read_timeout_per_mb,
+        }
+        self.webhook = None  # WebhookClient de la grabación en curso
+        self.upload_workers = max(int(upload_workers), 1)
+        self.upload_queue_size = max(int(upload_queue_size), 1)
+        self.upload_policy = upload_policy
+        self.upload_drain_timeout = upload_drain_timeout
+        self.uploads = None  # UploadQueue de la grabación en curso
+        self.spool = spool if spool is not None or not webhook_url else UploadSpool()
+        self.strict_ordering = strict_ordering
+        if strict_ordering and upload_policy == 'drop_oldest':
+            # Descartar un chunk rompería la secuencia que el modo estricto garantiza
+            logger.warning("La política 'drop_oldest' no es compatible con el orden estricto, usando 'block'")
+            self.upload_policy = 'block'
+        self.session_id = None  # UUID de la grabación (en cada envío y en el spool)
+        self.session_started = 0.0  # Hora (epoch) de inicio de la captura
+        self._sequence = 0  # Número de secuencia del próximo envío
+        self._order_broken = False  # Modo estricto: un envío falló y los siguientes van al spool
+        self._live = set()  # Modo estricto: secuencias encoladas que aún no se enviaron ni se guardaron
+        self._live_lock = threading.Lock()
         
         # Control de grabación
         self._stop = threading.Event()
         self.chunk_counter = 0
         
         # Configuración optimizada
-        self.samplerate = 44100
+        if sample_rate not in SUPPORTED_SAMPLE_RATES:
+            logger.warning(f"Sample rate {sample_rate} no soportado, usando {DEFAULT_SAMPLE_RATE}Hz")
+            sample_rate = DEFAULT_SAMPLE_RATE
+        self.samplerate = int(sample_rate)
         self.channels = 2
         self.dtype = np.int16
         self.blocksize = 4096  # Buffer grande para evitar overflow
+        self.buffer_seconds = 30  # Capacidad máxima de audio pendiente por fuente
+        self.dsp_batch = self.blocksize * 4  # Frames mínimos por pasada DSP
+        self.codec = create_codec(codec, self.samplerate, codec_bitrate)  # Codificación en memoria
+        self.health_interval = 10.0  # Segundos entre resúmenes de salud de la captura
+        self._health_problems = {}
+        
+        # Configuraciones de stream que ya funcionaron en cada dispositivo
+        self.stream_cache = StreamConfigCache()
         
-        # Buffers de audio
-        self.mic_buffer = queue.Queue()
-        self.sys_buffer = queue.Queue()
+        # Pistas de captura: buffer crudo (callback) -> DSP -> buffer mono del
+        # pipeline -> mezclador -> buffer de la mezcla que consume el chunker
+        if sources is None:
+            sources = self._default_sources(mic_index, sys_index)
+        # Cada etapa duerme hasta que la anterior le entrega datos (o hasta la parada)
+        self._dsp_wakeup = Wakeup()    # Bloque nuevo en un buffer crudo
+        self._chunk_wakeup = Wakeup()  # Mezcla nueva o fin de la etapa DSP
+        self._dsp_done = threading.Event()
+        
+        shared = self._shared_devices(sources)
+        self.tracks = []
+        for i, spec in enumerate(sources):
+            track = CaptureTrack(
+                spec.get('name') or f"fuente {i + 1}", self.samplerate, self.buffer_seconds,
+                source=self._make_source(spec, shared),
+                gain=float(spec.get('gain', 1.0)),
+                notify=self._dsp_wakeup
+            )
+            self.tracks.append(track)
+        self._active = []
+        self.mixer = None
+        self.mixed = RingBuffer(self.samplerate * self.buffer_seconds, notify=self._chunk_wakeup)
         
         # Directorio temporal
         self.temp_dir = Path(__file__).parent / 'temp_audio'
         self.temp_dir.mkdir(exist_ok=True)
         
-        logger.info(f"AudioRecorder inicializado: mic={mic_index}, sys={sys_index}, chunk_duration={chunk_duration}s")
+        names = ", ".join(f"{track.name} (x{track.gain})" for track in self.tracks)
+        logger.info(f"AudioRecorder inicializado: fuentes=[{names}], chunk_duration={chunk_duration}s, "
+                    f"chunk_mode={self.chunk_mode}, sample_rate={self.samplerate}Hz")
+
+    @staticmethod
+    def _default_sources(mic_index, sys_index):
+        """Fuentes equivalentes a los parámetros clásicos ``mic_index``/``sys_index``."""
+        sources = []
+        if mic_index is not None:
+            sources.append({'device': mic_index, 'kind': 'input', 'name': "micrófono", 'gain': 0.7})
+        if sys_index is not None:
+            sources.append({'device': sys_index, 'kind': 'loopback', 'name': "sistema", 'gain': 0.5})
+        if len(sources) == 1:
+            sources[0]['gain'] = 1.0  # Una sola fuente no se atenúa
+        return sources
+
+    def _shared_devices(self, sources):
+        """Un SharedDeviceSource por dispositivo usado por varias fuentes o con mapa de canales."""
+        groups = {}
+        for spec in sources:
+            if not isinstance(spec['device'], CaptureSource):
+                groups.setdefault(spec['device'], []).append(spec)
+        shared = {}
+        for device, specs in groups.items():
+            if len(specs) > 1 or specs[0].get('channels'):
+                kinds = {spec.get('kind', 'input') for spec in specs}
+                kind = 'loopback' if 'loopback' in kinds else 'input'
+                shared[device] = SharedDeviceSource(device, kind, self.samplerate, self.blocksize,
+                                                    self.stream_cache)
+                logger.info(f"Dispositivo {device} compartido por {len(specs)} fuentes en un solo stream")
+        return shared
+
+    def _make_source(self, spec, shared):
+        """Crea la fuente de captura de una entrada de ``sources`` (o la reutiliza)."""
+        device = spec['device']
+        if isinstance(device, CaptureSource):
+            return device
+        if device in shared:
+            return shared[device].member(spec.get('channels'))
+        return SoundDeviceSource(device, spec.get('kind', 'input'), self.samplerate, self.blocksize,
+                                 self.stream_cache)
 
     def run(self):
         """Método principal de grabación."""
@@ -96,33 +451,58 @@ class AudioRecorder(QThread):
             self.status_update.emit("Iniciando grabación...")
             self.recording_started.emit()
             self._stop.clear()
+            self.session_id = str(uuid.uuid4())
+            self.session_started = time.time()
+            self._sequence = 0
+            self._order_broken = False
+            self._live = set()
             
-            # Iniciar hilos de grabación
+            # Abrir las fuentes de captura (los callbacks llenan los buffers crudos)
             threads = []
+            self._active = []
+            for track in self.tracks:
+                try:
+                    track.source.start(track)
+                    self._active.append(track)
+                except Exception as e:
+                    logger.error(f"Error grabando {track.name}: {e}")
+                    self.error_occurred.emit(f"Error {track.name}: {e}")
+            # Un stream compartido se abre con su último miembro: si falló, ninguno graba
+            self._active = [track for track in self._active if not track.source.failed]
             
-            if self.mic_index is not None:
-                mic_thread = threading.Thread(target=self._record_microphone, daemon=True)
-                threads.append(mic_thread)
-                mic_thread.start()
+            # Sólo se mezclan las pistas que abrieron: una fuente caída no bloquea la mezcla
+            # El AGC no sube la ganancia por debajo de su puerta, que queda por
+            # encima del umbral de silencio para no alterar esa clasificación
+            agc = AutomaticGainControl(self.samplerate, gate_db=self.silence_threshold_db + 10)
+            self.mixer = Mixer([track.gain for track in self._active], self.dsp_batch * 2, agc)
             
-            if self.sys_index is not None:
-                sys_thread = threading.Thread(target=self._record_system, daemon=True)
-                threads.append(sys_thread)
-                sys_thread.start()
+            # Etapa DSP (downmix, conversión, resampleo y mezcla fuera del callback)
+            self._dsp_done.clear()
+            dsp_thread = threading.Thread(target=self._process_dsp, daemon=True)
+            dsp_thread.start()
+            threads.append(dsp_thread)
             
             # Hilo de procesamiento
             process_thread = threading.Thread(target=self._process_chunks, daemon=True)
             process_thread.start()
             threads.append(process_thread)
             
-            # Esperar hasta que se detenga
-            while not self._stop.is_set():
-                time.sleep(0.1)
+            # Esperar hasta que se detenga, resumiendo periódicamente la salud de la captura
+            self._health_problems = {}
+            next_report = time.monotonic() + self.health_interval
+            while not self._stop.wait(timeout=max(next_report - time.monotonic(), 0)):
+                self._report_health()
+                next_report += self.health_interval
             
-            # Esperar a que terminen los hilos
+            for track in self._active:
+                track.source.stop()
+            self._report_health()
+            
+            # Esperar a que terminen los hilos (el de chunks vacía antes la cola de envíos)
+            deadline = time.monotonic() + self.stop_timeout()
             for thread in threads:
                 if thread.is_alive():
-                    thread.join(timeout=2.0)
+                    thread.join(timeout=max(deadline - time.monotonic(), 0))
             
             self.status_update.emit("Grabación finalizada")
             
@@ -130,237 +510,286 @@ class AudioRecorder(QThread):
             logger.error(f"Error en grabación: {e}")
             self.error_occurred.emit(str(e))
 
-    def _record_microphone(self):
-        """Graba desde el micrófono."""
-        if self.mic_index is None:
-            return
-            
+    def _process_dsp(self):
+        """Etapa DSP: procesa en lotes lo que los callbacks dejan en los buffers crudos.
+
+        La primera pista activa es la referencia de tiempo; el resto se alinea
+        con ella usando los timestamps ADC de cada bloque. Lo alineado en todas
+        las pistas se mezcla en ``self.mixed``.
+        """
+        tracks = list(self._active)
+        outputs = [track.output for track in tracks]
+        # Pistas del mismo reloj que la referencia (stream compartido) ya están alineadas
+        reference = tracks[0] if tracks else None
+        references = {}
+        for track in tracks:
+            same_clock = track is reference or track.source.clock is reference.source.clock
+            references[track] = None if same_clock else reference
+        
         try:
-            device_info = sd.query_devices(self.mic_index)
-            logger.info(f"Grabando micrófono: {device_info['name']}")
-            
-            def callback(indata, frames, time, status):
-                if status:
-                    logger.warning(f"Mic status: {status}")
-                if not self._stop.is_set():
-                    # Convertir a mono si es estéreo
-                    if len(indata.shape) > 1 and indata.shape[1] > 1:
-                        mono_data = np.mean(indata, axis=1)
-                    else:
-                        mono_data = indata[:, 0] if len(indata.shape) > 1 else indata
-                    self.mic_buffer.put(mono_data.copy())
-            
-            # Configuraciones para el micrófono (priorizando compatibilidad)
-            mic_configs = [
-                {'channels': 1, 'dtype': 'float32', 'latency': 'high'},
-                {'channels': 2, 'dtype': 'float32', 'latency': 'high'},
-                {'channels': 1, 'dtype': 'int16', 'latency': 'high'},
-                {'channels': 2, 'dtype': 'int16', 'latency': 'high'}
-            ]
-            
-            success = False
-            for config in mic_configs:
-                try:
-                    max_channels = device_info.get('max_input_channels', 2)
-                    channels = min(config['channels'], max_channels)
-                    
-                    if channels == 0:
-                        continue
-                    
-                    with sd.InputStream(
-                        device=self.mic_index,
-                        channels=channels,
-                        samplerate=self.samplerate,
-                        callback=callback,
-                        blocksize=self.blocksize,
-                        dtype=config['dtype'],
-                        latency=config['latency']
-                    ):
-                        logger.info(f"Micrófono grabando con config: {config}")
-                        success = True
-                        while not self._stop.is_set():
-                            sd.sleep(100)
-                        break
-                except Exception as e:
-                    logger.warning(f"Config micrófono {config} falló: {e}")
-                    continue
+            while not self._stop.is_set():
+                # Limpiar antes de mirar los buffers: un bloque que llegue
+                # mientras se procesa impide dormir en ``wait``
+                self._dsp_wakeup.clear()
+                processed = 0
+                for track in tracks:
+                    try:
+                        processed += track.process(self.dsp_batch, references[track])
+                    except Exception as e:
+                        logger.error(f"Error DSP {track.name}: {e}")
+                processed += self._mix(outputs)
+                if not processed and not self._stop.is_set():
+                    # Dormir hasta el próximo bloque de un callback (o la parada)
+                    self._dsp_wakeup.wait()
             
-            if not success:
-                raise Exception("No se pudo configurar grabación del micrófono")
-                    
+            # Vaciar lo que quede tras detener la captura (el consumidor sigue leyendo)
+            deadline = time.monotonic() + 2.0
+            while time.monotonic() < deadline:
+                self._dsp_wakeup.clear()
+                processed = 0
+                for track in tracks:
+                    processed += track.process(reference=references[track])
+                # Sin datos crudos pendientes las pistas pueden terminar con
+                # longitudes distintas: se mezclan rellenando con silencio
+                pending = any(track.raw is not None and track.raw.available() for track in tracks)
+                processed += self._mix(outputs, flush=not pending)
+                if not pending and not any(output.available() for output in outputs):
+                    break
+                if not processed:
+                    # La mezcla puede estar llena: el consumidor avisa al leer
+                    self._dsp_wakeup.wait(timeout=max(deadline - time.monotonic(), 0))
+        finally:
+            self._dsp_done.set()
+            self._chunk_wakeup.set()
+
+    def _mix(self, outputs, flush=False):
+        """Mezcla todo lo que esté disponible en las pistas. Devuelve los frames mezclados."""
+        total = 0
+        try:
+            while True:
+                mixed = self.mixer.mix(outputs, self.mixed, flush)
+                if not mixed:
+                    return total
+                total += mixed
         except Exception as e:
-            logger.error(f"Error grabando micrófono: {e}")
-            self.error_occurred.emit(f"Error micrófono: {e}")
+            logger.error(f"Error mezclando pistas: {e}")
+            return total
 
-    def _record_system(self):
-        """Graba el audio del sistema usando loopback."""
-        if self.sys_index is None:
-            return
-            
+    def get_health_stats(self):
+        """Contadores de salud de cada fuente activa (overflows, descartes, callback, colas)."""
+        return {track.name: track.health() for track in self._active}
+
+    def _report_health(self):
+        """Registra el resumen de salud y avisa si aparecieron problemas nuevos."""
         try:
-            device_info = sd.query_devices(self.sys_index)
-            logger.info(f"Grabando sistema: {device_info['name']}")
-            
-            # Obtener el sample rate nativo del dispositivo
-            device_samplerate = int(device_info.get('default_samplerate', 44100))
-            logger.info(f"Sample rate del dispositivo: {device_samplerate}Hz")
-            
-            def callback(indata, frames, time, status):
-                if status:
-                    logger.warning(f"Sys status: {status}")
-                if not self._stop.is_set():
-                    # Convertir a mono si es estéreo
-                    if len(indata.shape) > 1 and indata.shape[1] > 1:
-                        mono_data = np.mean(indata, axis=1)
-                    else:
-                        mono_data = indata[:, 0] if len(indata.shape) > 1 else indata
-                    
-                    # Resamplear si es necesario
-                    if device_samplerate != self.samplerate:
-                        # Resampleo simple (para casos básicos)
-                        ratio = self.samplerate / device_samplerate
-                        if ratio != 1.0:
-                            new_length = int(len(mono_data) * ratio)
-                            if new_length > 0:
-                                indices = np.linspace(0, len(mono_data) - 1, new_length)
-                                mono_data = np.interp(indices, np.arange(len(mono_data)), mono_data)
-                    
-                    self.sys_buffer.put(mono_data.copy())
-            
-            # Configuraciones con sample rates múltiples
-            sample_rates = [device_samplerate, 44100, 48000, 22050]
-            configs = []
-            
-            for sr in sample_rates:
-                configs.extend([
-                    {'channels': 2, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
-                    {'channels': 1, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
-                    {'channels': 2, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr},
-                    {'channels': 1, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr}
-                ])
-            
-            success = False
-            for config in configs:
-                try:
-                    # Verificar si el dispositivo tiene canales de entrada
-                    max_input_channels = device_info.get('max_input_channels', 0)
-                    if max_input_channels == 0:
-                        # Si no tiene canales de entrada, intentar como dispositivo de salida con loopback
-                        max_channels = device_info.get('max_output_channels', 2)
-                    else:
-                        max_channels = max_input_channels
-                    
-                    channels = min(config['channels'], max_channels)
-                    if channels == 0:
-                        continue
-                    
-                    with sd.InputStream(
-                        device=self.sys_index,
-                        channels=channels,
-                        samplerate=config['samplerate'],
-                        callback=callback,
-                        blocksize=self.blocksize,
-                        dtype=config['dtype'],
-                        latency=config['latency']
-                    ):
-                        logger.info(f"Sistema grabando con config: {config}")
-                        success = True
-                        while not self._stop.is_set():
-                            sd.sleep(100)
-                        break
-                except Exception as e:
-                    logger.warning(f"Config {config} falló: {e}")
-                    continue
-            
-            if not success:
-                raise Exception("No se pudo configurar grabación del sistema")
-                
+            stats = self.get_health_stats()
+            for name, health in stats.items():
+                logger.info(
+                    f"Salud {name}: {health['blocks']} bloques, "
+                    f"overflow {health['input_overflows']}, underflow {health['input_underflows']}, "
+                    f"descartados {health['dropped_blocks']}, callback p50/p99/max "
+                    f"{health['callback_ms_p50']}/{health['callback_ms_p99']}/{health['callback_ms_max']} ms "
+                    f"(bloque {health['block_ms']} ms), cola {health['raw_depth_seconds']}s "
+                    f"(máx {health['max_depth_seconds']}s)"
+                )
+                problems = (health['input_overflows'] + health['input_underflows'] +
+                            health['dropped_blocks'] + health['output_overruns'])
+                if problems > self._health_problems.get(name, 0):
+                    message = (f"⚠️ {name}: {health['input_overflows']} overflows, "
+                               f"{health['dropped_blocks']} bloques descartados")
+                    logger.warning(message)
+                    self.status_update.emit(message)
+                self._health_problems[name] = problems
+            if self.encoder is not None:
+                encode = self.encoder.stats()
+                logger.info(
+                    f"Codificación: cola {encode['queue_depth']} (máx {encode['max_queue_depth']}), "
+                    f"{encode['delivered']}/{encode['submitted']} chunks, "
+                    f"media {encode['encode_ms_avg']} ms, espera {encode['blocked_seconds']}s"
+                )
+            if self.uploads is not None:
+                upload = self.uploads.stats()
+                logger.info(
+                    f"Envíos: cola {upload['queue_depth']} (máx {upload['max_queue_depth']}), "
+                    f"en curso {upload['in_flight']}, {upload['sent']}/{upload['submitted']} enviados, "
+                    f"{upload['failed']} fallidos, {upload['spilled']} a disco, "
+                    f"{upload['dropped']} descartados, espera {upload['blocked_seconds']}s"
+                )
+            self.health_update.emit(stats)
         except Exception as e:
-            logger.error(f"Error grabando sistema: {e}")
-            self.error_occurred.emit(f"Error sistema: {e}")
+            logger.error(f"Error generando resumen de salud: {e}")
+
+    def get_alignment_metrics(self):
+        """Error de alineación (muestras) y deriva (ppm) de cada pista secundaria."""
+        return {track.name: track.metrics() for track in self._active[1:]}
 
     def _process_chunks(self):
-        """Procesa y mezcla chunks de audio."""
-        chunk_samples = int(self.samplerate * self.chunk_duration)
-        mic_data = []
-        sys_data = []
-        
-        # Determinar qué fuentes están activas
-        mic_active = self.mic_index is not None
-        sys_active = self.sys_index is not None
+        """Corta la mezcla en chunks de ``chunk_duration`` segundos o en pausas de voz."""
+        boundary = None
+        self._overlap_samples = int(self.samplerate * self.chunk_overlap)
+        if self.chunk_mode == 'vad':
+            boundary = ChunkBoundaryDetector(self.samplerate, self.chunk_min_duration,
+                                             self.chunk_max_duration)
+            # El solapamiento debe ser múltiplo de la trama del VAD
+            self._overlap_samples -= self._overlap_samples % boundary.frame
+            self._chunk_samples = boundary.max_samples
+        else:
+            self._chunk_samples = int(self.samplerate * self.chunk_duration)
+        # Array float32 preasignado; el chunk se entrega como vista, sin copias.
+        # El solapamiento se conserva en el propio acumulador, sin otro historial
+        accumulator = ChunkAccumulator(self._chunk_samples + self._overlap_samples)
+        self._overlap_kept = 0     # Muestras al inicio del chunk en curso repetidas del anterior
+        self.silence = SilenceClassifier(self.samplerate, self.silence_threshold_db)
+        self._chunk_start = 0      # Muestra de la grabación donde empieza el próximo chunk
+        self._skipped_silence = 0.0  # Segundos de silencio omitidos desde el último envío
+        self.encoder = EncodePool(self.encode_workers, self._deliver_chunk)
+        # El chunk en curso se codifica a medida que llega (None si el códec no puede)
+        self._stream = self.codec.stream()
+        self._cut_encode_max = 0.0  # Máximo de codificación pendiente al cortar, hecha en el pool (s)
+        # Una sesión HTTP para toda la grabación: los chunks reutilizan la conexión.
+        # Los envíos salen de una cola acotada con hilos fijos (uno: en orden)
+        self.uploads = None
+        if self.webhook_url:
+            self.webhook = WebhookClient(self.webhook_url, **self.upload_options)
+            self.uploads = UploadQueue(self.upload_workers, self._send_chunk, self.upload_queue_size,
+                                       self.upload_policy, spill=self._spill_chunk, drop=self._drop_chunk)
         
         while not self._stop.is_set():
             try:
-                # Recopilar datos del micrófono solo si está activo
-                if mic_active:
-                    while len(mic_data) < chunk_samples and not self._stop.is_set():
-                        try:
-                            data = self.mic_buffer.get(timeout=0.1)
-                            mic_data.extend(data)
-                        except queue.Empty:
-                            break
-                
-                # Recopilar datos del sistema solo si está activo
-                if sys_active:
-                    while len(sys_data) < chunk_samples and not self._stop.is_set():
-                        try:
-                            data = self.sys_buffer.get(timeout=0.1)
-                            sys_data.extend(data)
-                        except queue.Empty:
-                            break
-                
-                # Determinar si tenemos suficientes datos para procesar
-                mic_ready = not mic_active or len(mic_data) >= chunk_samples
-                sys_ready = not sys_active or len(sys_data) >= chunk_samples
-                
-                if mic_ready and sys_ready:
-                    # Procesar chunk con los datos disponibles
-                    mic_chunk = mic_data[:chunk_samples] if mic_active else []
-                    sys_chunk = sys_data[:chunk_samples] if sys_active else []
-                    
-                    self._save_chunk(mic_chunk, sys_chunk)
-                    
-                    # Remover datos procesados
-                    if mic_active:
-                        mic_data = mic_data[chunk_samples:]
-                    if sys_active:
-                        sys_data = sys_data[chunk_samples:]
-                    
-                    self.chunk_counter += 1
+                # Recopilar la mezcla disponible
+                self._chunk_wakeup.clear()
+                received = accumulator.fill_from(self.mixed)
+                if received:
+                    self._dsp_wakeup.notify()  # Hay espacio en la mezcla
+
+                if self._cut_chunks(accumulator, boundary):
+                    for name, metrics in self.get_alignment_metrics().items():
+                        logger.info(f"Alineación {name}: error {metrics['alignment_error_samples']} muestras, "
+                                    f"deriva {metrics['drift_ppm']} ppm")
+                elif not received and not self._stop.is_set():
+                    # Sin datos nuevos: dormir hasta que la etapa DSP mezcle más
+                    self._chunk_wakeup.wait()
                 
             except Exception as e:
                 logger.error(f"Error procesando chunk: {e}")
-                time.sleep(0.1)
+                self._stop.wait(timeout=0.1)
         
         # IMPORTANTE: Procesar el chunk final cuando se detiene la grabación
         # Esto soluciona el problema de que el último audio no se envía
         try:
-            # Recopilar cualquier dato restante en los buffers
-            while not self.mic_buffer.empty():
-                try:
-                    data = self.mic_buffer.get_nowait()
-                    mic_data.extend(data)
-                except queue.Empty:
+            # Seguir leyendo mientras la etapa DSP vacía los buffers crudos
+            deadline = time.monotonic() + 3.0
+            while True:
+                self._chunk_wakeup.clear()
+                done = self._dsp_done.is_set() or time.monotonic() > deadline
+                while accumulator.fill_from(self.mixed):
+                    self._dsp_wakeup.notify()  # Hay espacio en la mezcla
+                    self._cut_chunks(accumulator, boundary)
+                if done:
                     break
+                self._chunk_wakeup.wait(timeout=max(deadline - time.monotonic(), 0))
             
-            while not self.sys_buffer.empty():
-                try:
-                    data = self.sys_buffer.get_nowait()
-                    sys_data.extend(data)
-                except queue.Empty:
-                    break
+            for track in self.tracks:
+                for buffer in (track.raw, track.output):
+                    if buffer is not None and buffer.overruns:
+                        logger.warning(f"Buffer de {track.name} desbordado: {buffer.overruns} muestras descartadas")
+            if self.mixed.overruns:
+                logger.warning(f"Buffer de la mezcla desbordado: {self.mixed.overruns} muestras descartadas")
             
             # Si hay datos restantes, procesarlos como chunk final
-            if mic_data or sys_data:
-                logger.info(f"Procesando chunk final con {len(mic_data)} muestras de mic y {len(sys_data)} muestras de sistema")
-                self._save_chunk(mic_data, sys_data, is_final=True)
-                self.chunk_counter += 1
+            if len(accumulator) > self._overlap_kept:
+                logger.info(f"Procesando chunk final con {len(accumulator)} muestras")
+                self._flush_chunk(accumulator, is_final=True)
                 
         except Exception as e:
             logger.error(f"Error procesando chunk final: {e}")
+        finally:
+            # Esperar a que se codifiquen (y se despachen en orden) los chunks pendientes
+            self._discard_stream(self._stream)
+            self._stream = None
+            self.encoder.close()
+            logger.info(f"Codificación: {self.get_encode_stats()}")
+            if self.uploads is not None:
+                self._drain_uploads()
+
+    def _cut_chunks(self, accumulator, boundary):
+        """Entrega los chunks completos del acumulador. Devuelve cuántos se entregaron."""
+        count = 0
+        while True:
+            self._encode_ahead(accumulator, boundary)
+            if boundary is None:
+                target = self._overlap_kept + self._chunk_samples
+                cut = target if len(accumulator) >= target else None
+            else:
+                cut = boundary.find_boundary(accumulator.data, self._overlap_kept)
+            if not cut:
+                return count
+            self._flush_chunk(accumulator, cut, boundary)
+            count += 1
+
+    def _encode_ahead(self, accumulator, boundary):
+        """Codifica las muestras que ya pertenecen con seguridad al chunk en curso.
 
-    def _save_chunk(self, mic_data, sys_data, is_final=False):
-        """Guarda un chunk mezclado."""
+        En modo fijo es todo hasta el corte; con VAD, hasta el mínimo de la
+        ventana, porque el corte puede caer en cualquier punto posterior.
+        """
+        if self._stream is None:
+            return
+        if boundary is None:
+            limit = self._overlap_kept + self._chunk_samples
+        else:
+            limit = self._overlap_kept + boundary.min_samples
+        end = min(len(accumulator), limit)
+        if end > self._stream.frames:
+            try:
+                self._stream.write(to_int16(accumulator.data[self._stream.frames:end]))
+            except Exception as e:
+                # El chunk se codificará entero en el pool
+                logger.error(f"Error codificando en streaming: {e}")
+                self._discard_stream(self._stream)
+                self._stream = None
+
+    @staticmethod
+    def _discard_stream(stream):
+        """Cierra un codificador incremental cuyo chunk no se va a enviar."""
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando codificador: {e}")
+
+    def _flush_chunk(self, accumulator, frames=None, boundary=None, is_final=False):
+        """Entrega ``frames`` muestras (todo por defecto) a ``_save_chunk``.
+
+        La cola de solapamiento se copia al chunk siguiente antes de guardar,
+        porque la codificación escala el chunk en el sitio. El buffer vuelve
+        al acumulador cuando el pool de codificación termina con él.
+        """
+        overlap = self._overlap_kept
+        keep = 0 if is_final else self._overlap_samples
+        chunk = accumulator.take(frames, keep)
+        keep = min(keep, len(chunk))
+        if boundary is not None:
+            boundary.consume(len(chunk) - keep)
+            logger.info(f"Corte por VAD: chunk de {len(chunk) / self.samplerate:.2f}s")
+        stream, self._stream = self._stream, None if is_final else self.codec.stream()
+        self._save_chunk(chunk, is_final, self._chunk_start, overlap, accumulator.recycle, stream)
+        self._chunk_start += len(chunk) - keep
+        self._overlap_kept = keep
+        self.chunk_counter += 1
+
+    def _save_chunk(self, mixed, is_final=False, start_sample=0, overlap=0, release=None, stream=None):
+        """Clasifica un chunk de la mezcla (array float32) y encola su codificación.
+
+        ``start_sample`` es la posición del chunk en la grabación y
+        ``overlap`` las muestras iniciales repetidas del chunk anterior;
+        viajan como metadatos para que el destino reconstruya la línea de tiempo.
+        ``release`` recibe el array cuando ya no se usa. ``stream`` es el
+        codificador incremental que ya procesó el principio del chunk; el
+        resto (con VAD, desde el mínimo de la ventana hasta el corte) lo
+        codifica el pool, no este hilo.
+        """
+        release = release or (lambda chunk: None)
         try:
             chunk_id = f"chunk_{self.chunk_counter:04d}"
             if is_final:
@@ -369,110 +798,196 @@ class AudioRecorder(QThread):
             else:
                 self.status_update.emit(f"Procesando {chunk_id}...")
             
-            # Asegurar que ambos arrays tengan la misma longitud
-            max_len = max(len(mic_data) if mic_data else 0, len(sys_data) if sys_data else 0)
-            if max_len == 0:
+            if not len(mixed):
                 logger.warning("No hay datos de audio para procesar en el chunk")
+                release(mixed)
                 return
             
-            # Rellenar con ceros si es necesario
-            if mic_data and len(mic_data) < max_len:
-                mic_data.extend([0] * (max_len - len(mic_data)))
-            elif not mic_data:
-                mic_data = [0] * max_len
-                
-            if sys_data and len(sys_data) < max_len:
-                sys_data.extend([0] * (max_len - len(sys_data)))
-            elif not sys_data:
-                sys_data = [0] * max_len
-            
-            # Convertir a numpy arrays
-            mic_array = np.array(mic_data, dtype=np.float32)
-            sys_array = np.array(sys_data, dtype=np.float32)
+            duration = len(mixed) / self.samplerate
+            captured_at = datetime.fromtimestamp(self.session_started + start_sample / self.samplerate,
+                                                 timezone.utc)
+            metadata = {
+                'session_id': self.session_id,
+                'captured_at': captured_at.isoformat(timespec='milliseconds'),
+                'chunk_index': self.chunk_counter,
+                'chunk_start': round(start_sample / self.samplerate, 3),
+                'chunk_duration': round(duration, 3),
+                'gap_before': round(self._skipped_silence, 3),
+                'overlap': round(overlap / self.samplerate, 3),
+            }
             
-            # Determinar qué fuentes están activas
-            mic_active = self.mic_index is not None
-            sys_active = self.sys_index is not None
-            
-            # Mezclar audio según las fuentes activas
-            if mic_active and sys_active:
-                # Ambas fuentes: mezclar con pesos
-                mixed = (mic_array * 0.7 + sys_array * 0.5)
-            elif mic_active:
-                # Solo micrófono
-                mixed = mic_array
-            elif sys_active:
-                # Solo sistema
-                mixed = sys_array
-            else:
-                # No debería llegar aquí, pero por seguridad
-                mixed = np.zeros_like(mic_array)
-            
-            # Normalizar para evitar clipping
-            max_val = np.max(np.abs(mixed))
-            if max_val > 0:
-                mixed = mixed / max_val * 0.8  # Dejar margen del 20%
-            
-            # Crear directorio para el chunk
-            chunk_dir = self.temp_dir / f"chunk_{self.chunk_counter}"
-            chunk_dir.mkdir(exist_ok=True)
-            
-            # Guardar como WAV primero
-            wav_path = chunk_dir / f"final_{self.chunk_counter:04d}.wav"
-            wavfile.write(str(wav_path), self.samplerate, (mixed * 32767).astype(np.int16))
+            # El AGC deja los silencios con ganancia unidad: el umbral sigue siendo válido
+            if self.silence.classify(mixed) and self.silence_policy != 'send':
+                release(mixed)
+                self._discard_stream(stream)
+                # El último chunk siempre se notifica para cerrar la grabación
+                if self.silence_policy == 'marker' or is_final:
+                    metadata['silence'] = True
+                    self._skipped_silence = 0.0
+                    # También pasa por el pool para respetar el orden de envío
+                    self.encoder.submit(self._encode_chunk, chunk_id, None, is_final, metadata)
+                    logger.info(f"Chunk {chunk_id} silencioso ({duration:.1f}s): enviado como marcador")
+                else:
+                    # Sólo cuenta el audio nuevo: el solapamiento ya estaba en el hueco
+                    self._skipped_silence += (len(mixed) - overlap) / self.samplerate
+                    logger.info(f"Chunk {chunk_id} silencioso ({duration:.1f}s): omitido")
+                return
+            self._skipped_silence = 0.0
             
-            # Convertir a MP3 si es posible
-            mp3_path = chunk_dir / f"final_{self.chunk_counter:04d}.mp3"
-            if self._convert_to_mp3(wav_path, mp3_path):
-                final_path = mp3_path
-                wav_path.unlink()  # Eliminar WAV temporal
-            else:
-                final_path = wav_path
+            if stream is not None and stream.frames > len(mixed):
+                self._discard_stream(stream)
+                stream = None
+            # La codificación no bloquea el corte: el acumulador sigue con otro buffer
+            self.encoder.submit(self._encode_chunk, chunk_id, mixed, is_final, metadata, release, stream)
             
-            # Enviar chunk
-            if self.webhook_url:
-                threading.Thread(
-                    target=self._send_chunk,
-                    args=(chunk_id, str(final_path), is_final),
-                    daemon=True
-                ).start()
+        except Exception as e:
+            logger.error(f"Error guardando chunk: {e}")
+            self.error_occurred.emit(f"Error guardando chunk: {e}")
+
+    def _encode_chunk(self, chunk_id, mixed, is_final, metadata, release=None, stream=None):
+        """Trabajo del pool: codifica el chunk en memoria con el códec.
+
+        Con ``stream`` (que ya codificó el principio del chunk) sólo se
+        codifica el resto y se cierra; si falla, el chunk se codifica entero.
+        Sin ``mixed`` es un marcador de silencio. Devuelve ``(chunk_id,
+        EncodedChunk o None, is_final, metadata)`` para el envío, o None si
+        falló. Sin webhook el chunk se guarda en disco; con webhook sólo
+        pasa al spool si su envío falla.
+        """
+        if mixed is None:
+            return chunk_id, None, is_final, metadata
+        try:
+            index = metadata['chunk_index']
+            codec = self.codec
+            encoded = None
+            if stream is not None:
+                start = time.perf_counter()
+                try:
+                    if len(mixed) > stream.frames:
+                        stream.write(to_int16(mixed[stream.frames:]))
+                    encoded = stream.finish()
+                except Exception as e:
+                    logger.error(f"Error codificando en streaming: {e}")
+                    self._discard_stream(stream)
+                self._cut_encode_max = max(self._cut_encode_max, time.perf_counter() - start)
+                if encoded is not None and release is not None:
+                    release(mixed)
+            if encoded is None:
+                # La mezcla, el AGC y el limitador ya los aplicó la etapa DSP
+                mixed *= 32767
+                samples = mixed.astype(np.int16)
+                if release is not None:
+                    release(mixed)
+                encoded = codec.encode(samples)
+                if encoded is None:
+                    codec = WavCodec(self.samplerate)
+                    encoded = codec.encode(samples)
             
-            logger.info(f"Chunk {chunk_id} guardado: {final_path}")
+            chunk = EncodedChunk(f"final_{index:04d}{codec.extension}", encoded, codec.content_type)
+            if not self.webhook_url:
+                path = self._write_chunk_file(index, chunk)
+                logger.info(f"Chunk {chunk_id} guardado: {path}")
+            return chunk_id, chunk, is_final, metadata
             
         except Exception as e:
             logger.error(f"Error guardando chunk: {e}")
             self.error_occurred.emit(f"Error guardando chunk: {e}")
+            return None
 
-    def _convert_to_mp3(self, wav_path, mp3_path):
-        """Convierte WAV a MP3."""
-        try:
-            if PYDUB_AVAILABLE:
-                audio = AudioSegment.from_wav(str(wav_path))
-                audio = audio.set_channels(1)  # Mono
-                audio.export(str(mp3_path), format="mp3", bitrate="128k")
-                return True
+    def _write_chunk_file(self, index, chunk):
+        """Escribe un chunk codificado en ``temp_audio/chunk_N/`` y devuelve su ruta."""
+        chunk_dir = self.temp_dir / f"chunk_{index}"
+        chunk_dir.mkdir(exist_ok=True)
+        path = chunk_dir / chunk.filename
+        path.write_bytes(chunk.data)
+        return path
+
+    def _deliver_chunk(self, result):
+        """Recibe del pool, en orden de chunk, los chunks codificados y encola su envío.
+
+        Aquí se numeran los envíos: el orden de entrega es el de la grabación.
+        """
+        if result is not None and self.uploads is not None:
+            chunk_id, chunk, is_final, metadata = result
+            metadata['sequence'] = self._sequence
+            self._sequence += 1
+            if self.strict_ordering:
+                with self._live_lock:
+                    self._live.add(metadata['sequence'])
+                    self.spool.hold(self.session_id, min(self._live))
+            # Modo estricto: cada envío empieza cuando se confirmaron los anteriores
+            self.uploads.submit(*result, barrier=self.strict_ordering)
+
+    def _settle(self, metadata):
+        """Modo estricto: el chunk ya se envió, se guardó o se descartó.
+
+        El spool no reenvía los chunks de la grabación a partir del primero
+        que siga en la cola o en curso, para que ninguno lo adelante.
+        """
+        if not self.strict_ordering or not metadata:
+            return
+        with self._live_lock:
+            self._live.discard(metadata.get('sequence'))
+            if self._live:
+                self.spool.hold(self.session_id, min(self._live))
             else:
-                logger.warning("pydub no disponible, manteniendo WAV")
-                return False
-        except Exception as e:
-            logger.error(f"Error convirtiendo a MP3: {e}")
-            return False
+                self.spool.release(self.session_id)
 
-    def _send_chunk(self, chunk_id, file_path, is_final=False):
-        """Envía un chunk al webhook."""
+    def _drain_uploads(self):
+        """Espera a los envíos pendientes; los que no salen a tiempo se guardan en disco."""
+        pending = self.uploads.depth() + self.uploads.in_flight
+        if pending:
+            self.status_update.emit(f"Enviando {pending} chunks pendientes...")
+        # En modo estricto lo que no empezó queda retenido en el spool hasta
+        # que termine el envío en curso (ver ``_settle``)
+        for item in self.uploads.close(self.upload_drain_timeout):
+            self._spill_chunk(*item)
+        if self.uploads.in_flight:
+            logger.warning(f"{self.uploads.in_flight} envíos siguen en curso tras {self.upload_drain_timeout}s")
+        else:
+            self.webhook.close()
+        logger.info(f"Envíos: {self.get_upload_stats()}")
+
+    def get_upload_stats(self):
+        """Métricas de la cola de envíos (profundidad, en curso, desbordes)."""
+        if self.uploads is None:
+            return {}
+        return self.uploads.stats()
+
+    def get_encode_stats(self):
+        """Métricas de la cola de codificación (profundidad, tiempos, esperas)."""
+        if self.encoder is None:
+            return {}
+        return dict(self.encoder.stats(), cut_encode_ms_max=round(self._cut_encode_max * 1000, 1))
+
+    def _send_chunk(self, chunk_id, chunk, is_final=False, metadata=None):
+        """Envía un chunk al webhook desde memoria (sin ``chunk``, sólo el marcador de silencio).
+
+        Si el envío falla, el chunk pasa al spool para reintentarlo.
+        Devuelve True si se envió.
+        """
+        if self._order_broken:
+            # Modo estricto: detrás del chunk fallido, para que el spool los reenvíe en orden
+            self._spill_chunk(chunk_id, chunk, is_final, metadata, "en espera de un chunk anterior")
+            return False
         try:
-            if not os.path.exists(file_path):
-                logger.error(f"Archivo no encontrado: {file_path}")
-                return
-                
-            file_size = os.path.getsize(file_path) / (1024 * 1024)
-            if is_final:
+            if chunk is None:
+                self.status_update.emit(f"Enviando {chunk_id} (silencio)...")
+            elif is_final:
+                file_size = len(chunk.data) / (1024 * 1024)
                 self.status_update.emit(f"Enviando {chunk_id} (ÚLTIMO CHUNK - {file_size:.2f} MB)...")
             else:
+                file_size = len(chunk.data) / (1024 * 1024)
                 self.status_update.emit(f"Enviando {chunk_id} ({file_size:.2f} MB)...")
             
-            # Pasar el parámetro is_final al webhook
-            success, message = send_to_webhook(self.webhook_url, file_path, is_final)
+            # Pasar el parámetro is_final y la posición del chunk al webhook
+            if chunk is None:
+                success, message = self.webhook.send(is_final, metadata=metadata)
+            else:
+                success, message = self.webhook.send(
+                    is_final, metadata=metadata,
+                    data=chunk.data, filename=chunk.filename, content_type=chunk.content_type
+                )
             
             self.finished_sending.emit(success, chunk_id)
             
@@ -481,23 +996,47 @@ class AudioRecorder(QThread):
                     self.status_update.emit(f"✅ Enviado {chunk_id} exitosamente (GRABACIÓN COMPLETA)")
                 else:
                     self.status_update.emit(f"Enviado {chunk_id} exitosamente")
-                # Limpiar archivo después de enviar
-                try:
-                    os.remove(file_path)
-                    # Limpiar directorio si está vacío
-                    chunk_dir = Path(file_path).parent
-                    if chunk_dir.exists() and not any(chunk_dir.iterdir()):
-                        chunk_dir.rmdir()
-                except Exception as e:
-                    logger.warning(f"Error limpiando archivos: {e}")
             else:
                 self.status_update.emit(f"Error enviando {chunk_id}: {message}")
+                self._spill_chunk(chunk_id, chunk, is_final, metadata, message)
+            return success
                 
         except Exception as e:
             logger.error(f"Error enviando chunk: {e}")
             self.error_occurred.emit(f"Error enviando chunk: {e}")
+            return False
+        finally:
+            self._settle(metadata)
+
+    def _spill_chunk(self, chunk_id, chunk, is_final=False, metadata=None, error=None):
+        """Guarda en el spool un chunk (o marcador) que no se envió, para reintentarlo."""
+        # Modo estricto: los chunks siguientes no deben adelantarlo
+        if self.strict_ordering:
+            self._order_broken = True
+        try:
+            self.spool.add(self.webhook_url, self.session_id, chunk_id, chunk, is_final, metadata, error)
+            logger.warning(f"Chunk {chunk_id} no enviado, guardado en el spool para reintentarlo")
+        except Exception as e:
+            logger.error(f"Error guardando chunk {chunk_id}: {e}")
+            self.error_occurred.emit(f"Error guardando chunk {chunk_id}: {e}")
+        finally:
+            self._settle(metadata)
+
+    def _drop_chunk(self, chunk_id, chunk, is_final=False, metadata=None):
+        """Avisa de un chunk descartado porque la cola de envíos estaba llena."""
+        message = f"⚠️ {chunk_id} descartado: el webhook no da abasto"
+        logger.warning(message)
+        self.status_update.emit(message)
+        self._settle(metadata)
+
+    def stop_timeout(self):
+        """Segundos que ``run`` puede tardar en terminar tras ``stop_recording``."""
+        return 2.0 + (self.upload_drain_timeout if self.webhook_url else 0)
 
     def stop_recording(self):
         """Detiene la grabación."""
         self._stop.set()
+        # Despertar a las etapas para que vacíen sus buffers de inmediato
+        self._dsp_wakeup.set()
+        self._chunk_wakeup.set()
         self.status_update.emit("Deteniendo grabación...")
\ No newline at end of file
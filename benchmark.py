@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del pipeline de audio (sin hardware de audio).
+
+Uso:
+    python benchmark.py resampler [segundos]
+    python benchmark.py pipeline [segundos] [micrófonos]
+    python benchmark.py replay <archivo.wav|flac> [archivo_sistema]
+"""
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from audio_dsp import PolyphaseResampler
+from capture_sources import SyntheticSource, FileReplaySource
+
+RATE_PAIRS = [(44100, 48000), (48000, 44100), (48000, 16000), (44100, 16000)]
+
+
+def _legacy_interp_resample(block, src_rate, dst_rate):
+    """Resampleo por bloque que hacía antes el callback de sistema (referencia)."""
+    new_length = int(len(block) * dst_rate / src_rate)
+    indices = np.linspace(0, len(block) - 1, new_length)
+    return np.interp(indices, np.arange(len(block)), block)
+
+
+def _best_of(func, repeats=5):
+    """Mejor tiempo de CPU de ``repeats`` ejecuciones."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def bench_resampler(seconds=60, blocksize=4096, batch=16384):
+    """Compara el resampler polifásico con la interpolación lineal por bloque."""
+    print(f"⏱️  Resampleo de {seconds}s de audio (CPU por segundo de audio)")
+    print("-" * 70)
+    for src_rate, dst_rate in RATE_PAIRS:
+        signal = np.random.default_rng(0).standard_normal(src_rate * seconds).astype(np.float32)
+
+        def run_legacy():
+            for i in range(0, len(signal), blocksize):
+                _legacy_interp_resample(signal[i:i + blocksize], src_rate, dst_rate)
+
+        def run_polyphase():
+            resampler = PolyphaseResampler(src_rate, dst_rate)
+            for i in range(0, len(signal), batch):
+                resampler.process(signal[i:i + batch])
+
+        legacy = _best_of(run_legacy) / seconds * 1000
+        poly = _best_of(run_polyphase) / seconds * 1000
+        print(f"{src_rate:>6} -> {dst_rate:<6} interp: {legacy:6.3f} ms/s   "
+              f"polifásico: {poly:6.3f} ms/s   ({legacy / poly:4.2f}x)")
+
+
+def run_pipeline(sources, chunk_duration=10):
+    """Ejecuta AudioRecorder sin webhook hasta agotar las fuentes y mide el rendimiento.
+
+    ``sources`` tiene el formato del parámetro ``sources`` de AudioRecorder.
+    """
+    # Sólo aquí: audio_handler necesita PySide6, que el benchmark del resampler no usa
+    from audio_handler import AudioRecorder
+    recorder = AudioRecorder(webhook_url=None, chunk_duration=chunk_duration, sources=sources)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        recorder.temp_dir = Path(temp_dir)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        thread = threading.Thread(target=recorder.run)
+        thread.start()
+        for track in recorder.tracks:
+            track.source.finished.wait()
+        # Dejar que el DSP consuma lo ya capturado (salvo el último lote parcial)
+        while any(track.raw is not None and track.raw.available() >= recorder.dsp_batch
+                  for track in recorder.tracks):
+            time.sleep(0.01)
+        recorder.stop_recording()
+        thread.join()
+
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    reference = recorder.tracks[0]
+    audio_seconds = reference.frames_captured / reference.source.samplerate
+    print(f"🎧 Audio procesado: {audio_seconds:.1f}s de {len(recorder.tracks)} fuentes "
+          f"en {recorder.chunk_counter} chunks")
+    print(f"⏱️  Tiempo real: {wall:.2f}s  ({audio_seconds / wall:.1f}x tiempo real)")
+    print(f"🧮 CPU: {cpu:.2f}s  ({cpu / audio_seconds * 1000:.2f} ms por segundo de audio)")
+    for name, metrics in recorder.get_alignment_metrics().items():
+        print(f"📐 Alineación {name}: {metrics}")
+    for name, health in recorder.get_health_stats().items():
+        print(f"🩺 Salud {name}: {health}")
+    print(f"🧵 Codificación: {recorder.get_encode_stats()}")
+    return recorder
+
+
+def bench_pipeline(seconds=120, microphones=1):
+    """Pipeline completo con N micrófonos de voz sintética (48 kHz) + sistema (44.1 kHz estéreo)."""
+    sources = [
+        {'device': SyntheticSource(48000, channels=1, signal='speech', duration=seconds,
+                                   realtime=False, seed=i),
+         'name': f"micrófono {i + 1}", 'gain': 0.7 / microphones}
+        for i in range(microphones)
+    ]
+    sources.append({
+        'device': SyntheticSource(44100, channels=2, signal='tone', duration=seconds,
+                                  realtime=False, level=0.1),
+        'name': "sistema", 'gain': 0.5
+    })
+    run_pipeline(sources)
+
+
+def bench_replay(mic_path, sys_path=None):
+    """Pipeline completo alimentado con archivos WAV/FLAC, tan rápido como sea posible."""
+    sources = [{'device': FileReplaySource(mic_path, realtime=False), 'name': "micrófono", 'gain': 0.7}]
+    if sys_path:
+        sources.append({'device': FileReplaySource(sys_path, realtime=False), 'name': "sistema", 'gain': 0.5})
+    else:
+        sources[0]['gain'] = 1.0
+    run_pipeline(sources)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "resampler"
+    if command == "resampler":
+        bench_resampler(int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    elif command == "pipeline":
+        bench_pipeline(int(sys.argv[2]) if len(sys.argv) > 2 else 120,
+                       int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+    elif command == "replay" and len(sys.argv) > 2:
+        bench_replay(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -112,7 +112,7 @@ class BuildManager:
         self.log("⚡ Optimizando imports...")
         
         # Verificar que los archivos principales existan
-        main_files = ['main.py', 'audio_handler.py', 'utils.py', 'audio_device_tester.py']
+        main_files = ['main.py', 'audio_handler.py', 'audio_buffer.py', 'audio_dsp.py', 'stream_cache.py', 'capture_sources.py', 'capture_stats.py', 'chunking.py', 'encode_pool.py', 'upload_queue.py', 'upload_spool.py', 'audio_codecs.py', 'utils.py', 'audio_device_tester.py']
         for file in main_files:
             if not (self.base_dir / file).exists():
                 self.log(f"   ❌ Archivo faltante: {file}", "ERROR")
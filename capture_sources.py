@@ -0,0 +1,414 @@
+"""
+Fuentes de captura intercambiables para AudioRecorder.
+
+Una fuente entrega bloques a una CaptureTrack llamando a
+``track.capture(indata, time_info)``, igual que un callback de PortAudio.
+Además de la fuente real (sounddevice) hay una sintética y otra que reproduce
+archivos WAV/FLAC, para ejecutar y medir el pipeline sin hardware de audio.
+Varias pistas sobre el mismo dispositivo comparten un único stream con
+SharedDeviceSource.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# Importaciones opcionales
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Equivalente mínimo del argumento ``time`` de los callbacks de PortAudio
+BlockTime = namedtuple('BlockTime', ['inputBufferAdcTime', 'currentTime'])
+
+
+class CaptureSource:
+    """Interfaz de una fuente de captura.
+
+    ``start(track)`` abre la fuente, llama a ``track.open(channels, dtype,
+    samplerate)`` con el formato real y empieza a entregar bloques sin
+    bloquear al llamador. ``stop()`` deja de entregarlos y libera recursos.
+
+    Las fuentes con el mismo ``clock`` entregan muestras de un mismo reloj
+    y con el mismo origen, así que no necesitan alinearse entre sí.
+    """
+
+    name = "fuente"
+    failed = False  # True si la fuente no llegó a abrirse tras start()
+
+    @property
+    def clock(self):
+        return self
+
+    def start(self, track):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class SoundDeviceSource(CaptureSource):
+    """Dispositivo real vía ``sounddevice.InputStream``.
+
+    ``kind`` es ``'input'`` para micrófonos o ``'loopback'`` para captura del
+    sistema (p. ej. VB-Audio CABLE Output). Se abre primero a la frecuencia
+    nativa del dispositivo (la conversión a ``samplerate``, la del pipeline,
+    la hace la etapa DSP una sola vez) y después se prueban alternativas.
+    """
+
+    def __init__(self, device, kind='input', samplerate=44100, blocksize=4096, stream_cache=None,
+                 min_channels=1):
+        self.device = device
+        self.kind = kind
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.stream_cache = stream_cache
+        self.min_channels = min_channels  # Canales necesarios por un mapa de canales
+        self.name = f"dispositivo {device}"
+        self._stream = None
+
+    def _candidate_configs(self, device_info):
+        """Configuraciones a probar, en orden de preferencia."""
+        device_samplerate = int(device_info.get('default_samplerate', 0) or self.samplerate)
+        logger.info(f"Sample rate del dispositivo: {device_samplerate}Hz")
+        if self.kind == 'input':
+            configs = []
+            for sr in dict.fromkeys([device_samplerate, self.samplerate]):
+                configs.extend([
+                    {'channels': 1, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
+                    {'channels': 2, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
+                    {'channels': 1, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr},
+                    {'channels': 2, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr}
+                ])
+            return configs
+
+        # Loopback: sample rate nativo primero y después alternativas comunes
+        configs = []
+        for sr in dict.fromkeys([device_samplerate, self.samplerate, 44100, 48000, 22050]):
+            configs.extend([
+                {'channels': 2, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
+                {'channels': 1, 'dtype': 'float32', 'latency': 'high', 'samplerate': sr},
+                {'channels': 2, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr},
+                {'channels': 1, 'dtype': 'int16', 'latency': 'high', 'samplerate': sr}
+            ])
+        return configs
+
+    def _max_channels(self, device_info):
+        max_input_channels = device_info.get('max_input_channels', 0)
+        if self.kind == 'loopback' and max_input_channels == 0:
+            # Si no tiene canales de entrada, intentar como dispositivo de salida con loopback
+            return device_info.get('max_output_channels', 2)
+        return max_input_channels
+
+    def start(self, track):
+        # Importación diferida: sin PortAudio instalado se pueden seguir usando
+        # las fuentes sintética y de archivo (benchmarks, CI)
+        import sounddevice as sd
+        device_info = sd.query_devices(self.device)
+        self.name = device_info['name']
+        logger.info(f"Grabando {track.name}: {self.name}")
+
+        def callback(indata, frames, time, status):
+            # Sólo copiar y contar; el DSP y el log se hacen fuera del callback
+            track.capture(indata, time, status)
+
+        configs = self._candidate_configs(device_info)
+
+        # Probar primero la configuración que funcionó la última vez
+        cached = self.stream_cache.lookup(self.device) if self.stream_cache else None
+        if cached:
+            logger.info(f"Usando configuración en caché para {track.name}: {cached}")
+            configs.insert(0, cached)
+
+        max_channels = self._max_channels(device_info)
+        for config in configs:
+            channels = min(max(config['channels'], self.min_channels), max_channels)
+            if channels == 0:
+                continue
+            try:
+                track.open(channels, config['dtype'], config['samplerate'])
+                stream = sd.InputStream(
+                    device=self.device,
+                    channels=channels,
+                    samplerate=config['samplerate'],
+                    callback=callback,
+                    blocksize=self.blocksize,
+                    dtype=config['dtype'],
+                    latency=config.get('latency', 'high')
+                )
+                stream.start()
+            except Exception as e:
+                logger.warning(f"Config {track.name} {config} falló: {e}")
+                if config is cached:
+                    self.stream_cache.invalidate(self.device)
+                continue
+
+            self._stream = stream
+            config = dict(config, channels=channels)
+            logger.info(f"{track.name.capitalize()} grabando con config: {config}")
+            if self.stream_cache:
+                self.stream_cache.store(self.device, config)
+            return
+
+        raise Exception(f"No se pudo configurar grabación del {track.name}")
+
+    def stop(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando stream de {self.name}: {e}")
+
+
+class _ChannelTap:
+    """Reparte cada bloque de un stream compartido entre las pistas miembro.
+
+    Se comporta como una CaptureTrack frente a SoundDeviceSource: recibe
+    ``open`` y ``capture`` y los reenvía a cada pista con sus canales.
+    """
+
+    def __init__(self, members, blocksize):
+        self.members = members  # [(track, canales del dispositivo o None)]
+        self.blocksize = blocksize
+        self.name = " + ".join(track.name for track, _ in members)
+        self._selectors = []
+
+    def open(self, channels, dtype, device_rate):
+        self._selectors = []
+        for track, wanted in self.members:
+            selected = list(range(channels)) if wanted is None else [c for c in wanted if c < channels]
+            if not selected:
+                raise ValueError(f"{track.name}: ningún canal de {wanted} disponible en {channels}")
+            if selected == list(range(selected[0], selected[-1] + 1)):
+                # Canales contiguos: basta una vista del bloque
+                selector = slice(selected[0], selected[-1] + 1)
+                scratch = None
+            else:
+                selector = selected
+                scratch = np.zeros((self.blocksize * 2, len(selected)), dtype=dtype)
+            self._selectors.append((track, selector, scratch))
+            track.open(len(selected), dtype, device_rate)
+
+    def capture(self, indata, time_info, status=None):
+        for track, selector, scratch in self._selectors:
+            if scratch is None or len(indata) > len(scratch):
+                block = indata[:, selector]
+            else:
+                block = np.take(indata, selector, axis=1, out=scratch[:len(indata)])
+            track.capture(block, time_info, status)
+
+
+class SharedDeviceSource:
+    """Un único stream de PortAudio para varias pistas sobre el mismo dispositivo.
+
+    Útil con dispositivos agregados o multicanal (p. ej. micrófono en el
+    canal 0 y retorno del sistema en 2-3): un solo callback, un solo reloj y
+    ninguna deriva entre las pistas. PortAudio no puede combinar en un
+    stream de entrada dos dispositivos distintos, así que sólo se comparte
+    cuando las fuentes apuntan al mismo índice.
+    """
+
+    def __init__(self, device, kind='input', samplerate=44100, blocksize=4096, stream_cache=None):
+        self.device = device
+        self.kind = kind
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.stream_cache = stream_cache
+        self.failed = False
+        self._members = []
+        self._pending = []
+        self._running = 0
+        self._stream_source = None
+
+    def member(self, channels=None):
+        """Crea la fuente de una pista que usa ``channels`` (None = todos, a mono)."""
+        source = SharedChannelSource(self, channels)
+        self._members.append(source)
+        return source
+
+    def _register(self, source, track):
+        # El stream se abre cuando se ha registrado el último miembro, para
+        # que todas las pistas empiecen en el mismo frame
+        self._pending.append((track, source.channels))
+        if len(self._pending) < len(self._members):
+            return
+        pending, self._pending = self._pending, []
+        needed = max((max(channels) + 1 for _, channels in pending if channels), default=1)
+        self._stream_source = SoundDeviceSource(self.device, self.kind, self.samplerate, self.blocksize,
+                                                self.stream_cache, min_channels=needed)
+        try:
+            self._stream_source.start(_ChannelTap(pending, self.blocksize))
+        except Exception:
+            self.failed = True
+            raise
+        self._running = len(pending)
+
+    def _release(self):
+        self._running -= 1
+        if self._running <= 0 and self._stream_source is not None:
+            self._stream_source.stop()
+            self._stream_source = None
+
+
+class SharedChannelSource(CaptureSource):
+    """Pista de un SharedDeviceSource: selecciona sus canales del stream común."""
+
+    def __init__(self, shared, channels=None):
+        self.shared = shared
+        self.channels = None if channels is None else [int(c) for c in channels]
+        self.samplerate = shared.samplerate
+        self.name = f"dispositivo {shared.device} canales {channels if channels else 'todos'}"
+
+    @property
+    def clock(self):
+        return self.shared
+
+    @property
+    def failed(self):
+        return self.shared.failed
+
+    def start(self, track):
+        self.shared._register(self, track)
+
+    def stop(self):
+        self.shared._release()
+
+
+class _ThreadedSource(CaptureSource):
+    """Base de las fuentes simuladas: un hilo entrega bloques como lo haría PortAudio.
+
+    En modo ``realtime`` los bloques llegan al ritmo del reloj; si no, tan
+    rápido como el pipeline los consume (se espera a que haya espacio en el
+    buffer crudo para no perder datos).
+    """
+
+    def __init__(self, samplerate, channels, blocksize, realtime):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.finished = threading.Event()  # Se activa al agotarse la fuente
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _blocks(self):
+        """Genera bloques (frames, canales) float32; termina cuando se agota la fuente."""
+        raise NotImplementedError
+
+    def start(self, track):
+        track.open(self.channels, 'float32', self.samplerate)
+        self._stop.clear()
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._run, args=(track,), daemon=True)
+        self._thread.start()
+        logger.info(f"Grabando {track.name}: {self.name}")
+
+    def _run(self, track):
+        start = time.monotonic()
+        frames = 0
+        try:
+            for block in self._blocks():
+                if self._stop.is_set():
+                    break
+                if self.realtime:
+                    delay = start + frames / self.samplerate - time.monotonic()
+                    if delay > 0 and self._stop.wait(timeout=delay):
+                        break
+                else:
+                    while track.raw.free() < len(block) and not self._stop.wait(timeout=0.001):
+                        pass
+                # Reloj virtual: exacto en ambos modos, como un ADC ideal
+                adc_time = start + frames / self.samplerate
+                track.capture(block, BlockTime(adc_time, adc_time))
+                frames += len(block)
+        except Exception as e:
+            logger.error(f"Error en fuente {self.name}: {e}")
+        finally:
+            self.finished.set()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+
+class SyntheticSource(_ThreadedSource):
+    """Generador de señal de prueba: tono, ruido o ráfagas con cadencia de voz."""
+
+    SIGNALS = ('tone', 'noise', 'speech')
+
+    def __init__(self, samplerate=48000, channels=1, blocksize=4096, signal='speech',
+                 duration=None, realtime=True, level=0.3, frequency=440.0, seed=0):
+        super().__init__(samplerate, channels, blocksize, realtime)
+        if signal not in self.SIGNALS:
+            raise ValueError(f"Señal desconocida: {signal}")
+        self.signal = signal
+        self.duration = duration
+        self.level = level
+        self.frequency = frequency
+        self.seed = seed
+        self.name = f"sintética ({signal}, {samplerate}Hz)"
+
+    def _envelope(self, rng, frames):
+        """Ráfagas de 0.2-1.5 s separadas por pausas de 0.1-0.8 s."""
+        envelope = np.zeros(frames, dtype=np.float32)
+        pos = 0
+        while pos < frames:
+            burst = int(rng.uniform(0.2, 1.5) * self.samplerate)
+            pause = int(rng.uniform(0.1, 0.8) * self.samplerate)
+            envelope[pos:pos + burst] = np.hanning(burst)[:frames - pos] if burst > 1 else 0
+            pos += burst + pause
+        return envelope
+
+    def _blocks(self):
+        rng = np.random.default_rng(self.seed)
+        total = int(self.duration * self.samplerate) if self.duration else None
+        # Una envolvente de 10 s reutilizada en bucle evita generar ráfagas por bloque
+        envelope = self._envelope(rng, self.samplerate * 10)
+        pos = 0
+        while total is None or pos < total:
+            frames = self.blocksize if total is None else min(self.blocksize, total - pos)
+            n = np.arange(pos, pos + frames)
+            if self.signal == 'tone':
+                mono = np.sin(2 * np.pi * self.frequency * n / self.samplerate)
+            elif self.signal == 'noise':
+                mono = rng.standard_normal(frames) * 0.3
+            else:
+                carrier = (np.sin(2 * np.pi * 180.0 * n / self.samplerate)
+                           + 0.3 * rng.standard_normal(frames))
+                mono = carrier * envelope[n % len(envelope)]
+            block = (mono * self.level).astype(np.float32)
+            yield np.repeat(block[:, None], self.channels, axis=1)
+            pos += frames
+
+
+class FileReplaySource(_ThreadedSource):
+    """Reproduce un archivo WAV/FLAC como si fuera un dispositivo de captura."""
+
+    def __init__(self, path, blocksize=4096, realtime=True, loop=False):
+        if not SOUNDFILE_AVAILABLE:
+            raise ImportError("soundfile no disponible, no se pueden reproducir archivos")
+        info = sf.info(str(path))
+        super().__init__(info.samplerate, info.channels, blocksize, realtime)
+        self.path = str(path)
+        self.loop = loop
+        self.name = f"archivo {self.path}"
+
+    def _blocks(self):
+        with sf.SoundFile(self.path) as audio:
+            while True:
+                block = audio.read(self.blocksize, dtype='float32', always_2d=True)
+                if len(block) == 0:
+                    if not self.loop:
+                        return
+                    audio.seek(0)
+                    continue
+                yield block
@@ -0,0 +1,66 @@
+"""
+Contadores de salud de la captura: overflows, underflows, bloques descartados,
+duración del callback y profundidad de la cola.
+
+Los escribe únicamente el callback de su stream (un solo escritor), así que no
+usan locks ni asignan memoria: la duración de cada callback se guarda en un
+array circular preasignado y los percentiles se calculan al leerlos, fuera del
+hilo de tiempo real.
+"""
+import numpy as np
+
+
+class CaptureStats:
+    """Contadores de un stream de captura, actualizados desde su callback."""
+
+    DURATION_CAPACITY = 2048  # Últimas duraciones de callback conservadas
+
+    def __init__(self):
+        self._durations = np.zeros(self.DURATION_CAPACITY, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.blocks = 0
+        self.frames = 0
+        self.input_overflows = 0   # PortAudio perdió datos antes del callback
+        self.input_underflows = 0
+        self.dropped_blocks = 0    # Bloques que no cupieron enteros en el buffer crudo
+        self.dropped_frames = 0
+        self.max_duration = 0.0
+        self.max_depth = 0         # Máximo de frames pendientes en el buffer crudo
+        self._durations[:] = 0.0
+
+    def record(self, status, duration, dropped, depth, frames):
+        """Registra un callback: flags de estado, duración (s), frames descartados y cola."""
+        if status:
+            if getattr(status, 'input_overflow', False):
+                self.input_overflows += 1
+            if getattr(status, 'input_underflow', False):
+                self.input_underflows += 1
+        if dropped:
+            self.dropped_blocks += 1
+            self.dropped_frames += dropped
+        self._durations[self.blocks % self.DURATION_CAPACITY] = duration
+        if duration > self.max_duration:
+            self.max_duration = duration
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.frames += frames
+        self.blocks += 1
+
+    def snapshot(self):
+        """Copia de los contadores con los percentiles de duración en milisegundos."""
+        count = min(self.blocks, self.DURATION_CAPACITY)
+        durations = self._durations[:count].copy()
+        p50, p99 = np.percentile(durations, [50, 99]) * 1000 if count else (0.0, 0.0)
+        return {
+            'blocks': self.blocks,
+            'input_overflows': self.input_overflows,
+            'input_underflows': self.input_underflows,
+            'dropped_blocks': self.dropped_blocks,
+            'dropped_frames': self.dropped_frames,
+            'callback_ms_p50': round(float(p50), 3),
+            'callback_ms_p99': round(float(p99), 3),
+            'callback_ms_max': round(self.max_duration * 1000, 3),
+            'max_depth_frames': self.max_depth,
+        }
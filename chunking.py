@@ -0,0 +1,132 @@
+"""
+Políticas de corte de chunks sobre la mezcla.
+
+Por defecto se corta cada ``chunk_duration`` segundos. En modo ``vad`` el
+corte se hace en la primera pausa de voz dentro de una ventana [mín, máx],
+para no partir palabras entre dos envíos. Los chunks silenciosos pueden
+enviarse como un marcador ligero u omitirse.
+"""
+import numpy as np
+
+from audio_dsp import VoiceActivityDetector
+
+CHUNK_MODES = ('fixed', 'vad')
+
+
+class ChunkBoundaryDetector:
+    """Busca el punto de corte en pausas de voz del chunk en curso.
+
+    Analiza de forma incremental sólo las tramas nuevas del chunk. Corta en
+    mitad de la primera pausa de al menos ``min_pause`` segundos que deje el
+    chunk entre ``min_seconds`` y ``max_seconds``; si al llegar al máximo no
+    hubo ninguna, corta en la trama más silenciosa de la ventana.
+    """
+
+    def __init__(self, samplerate, min_seconds, max_seconds, min_pause=0.3, vad=None):
+        self.vad = vad or VoiceActivityDetector(samplerate)
+        frame = self.vad.frame
+        self.frame = frame
+        self.min_frames = int(min_seconds * samplerate) // frame
+        self.max_frames = max(int(max_seconds * samplerate) // frame, self.min_frames + 1)
+        self.pause_frames = max(int(min_pause * samplerate) // frame, 2)
+        # Capacidad extra para el solapamiento (siempre menor que la ventana)
+        self._speech = np.zeros(2 * self.max_frames + 1, dtype=bool)
+        self._energy = np.zeros(2 * self.max_frames + 1, dtype=np.float32)
+        self._analyzed = 0  # Tramas del chunk en curso ya clasificadas
+
+    @property
+    def min_samples(self):
+        """Muestras (tras el solapamiento) que todo chunk tiene seguro."""
+        return self.min_frames * self.frame
+
+    @property
+    def max_samples(self):
+        return self.max_frames * self.frame
+
+    def find_boundary(self, samples, start=0):
+        """Muestras del chunk a cortar ya, o None si todavía hay que esperar.
+
+        ``samples`` es todo lo acumulado desde el último corte; sus primeras
+        ``start`` muestras (múltiplo de la trama) son solapamiento con el
+        chunk anterior y no cuentan para la ventana [mín, máx].
+        """
+        offset = start // self.frame
+        min_frames = offset + self.min_frames
+        max_frames = offset + self.max_frames
+        available = min(len(samples) // self.frame, max_frames)
+        if available > self._analyzed:
+            start = self._analyzed
+            energy, speech = self.vad.classify(samples[start * self.frame:available * self.frame])
+            self._energy[start:available] = energy
+            self._speech[start:available] = speech
+            self._analyzed = available
+        if available < min_frames + self.pause_frames // 2:
+            return None
+
+        cut = self._pause_cut(available, min_frames, max_frames)
+        if cut is None and available >= max_frames:
+            # Sin pausas: la trama más silenciosa de la ventana
+            window = self._energy[min_frames:max_frames]
+            cut = min_frames + int(np.argmin(window))
+        return None if cut is None else cut * self.frame
+
+    def _pause_cut(self, available, min_frames, max_frames):
+        """Trama de corte en la primera pausa válida, o None."""
+        silent = ~self._speech[:available]
+        edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        half = self.pause_frames // 2
+        # Centro de la pausa, sin cortar antes del mínimo y con media pausa a cada lado
+        cuts = np.maximum(starts + half, min_frames)
+        valid = (ends - cuts >= half) & (cuts <= max_frames)
+        if not valid.any():
+            return None
+        return int(cuts[np.argmax(valid)])
+
+    def consume(self, samples):
+        """Descarta el análisis de las ``samples`` ya entregadas en un chunk."""
+        frames = min(samples // self.frame, self._analyzed)
+        remaining = self._analyzed - frames
+        self._speech[:remaining] = self._speech[frames:self._analyzed]
+        self._energy[:remaining] = self._energy[frames:self._analyzed]
+        self._analyzed = remaining
+
+
+SILENCE_POLICIES = ('send', 'marker', 'skip')
+
+
+class SilenceClassifier:
+    """Decide si un chunk completo es silencio, con histéresis entre chunks.
+
+    Mide el RMS de ventanas de ``window_ms`` y el pico del chunk en dBFS
+    (el AGC no amplifica por debajo de su puerta, así que el silencio llega
+    con su nivel real). Es silencio si la ventana más fuerte queda por debajo
+    del umbral y el pico por debajo de ``peak_db``. Tras un chunk silencioso
+    el umbral sube ``hysteresis_db``, para que un ruido de fondo en el límite
+    no alterne entre enviar y omitir.
+    """
+
+    def __init__(self, samplerate, threshold_db=-50.0, hysteresis_db=6.0, peak_db=-20.0, window_ms=100.0):
+        self.window = max(int(samplerate * window_ms / 1000), 1)
+        self.threshold_db = threshold_db
+        self.hysteresis_db = hysteresis_db
+        self.peak_db = peak_db
+        self.silent = False
+
+    def measure(self, chunk):
+        """RMS de la ventana más fuerte y pico del chunk, en dBFS."""
+        count = max(len(chunk) // self.window, 1)
+        windows = chunk[:count * self.window].reshape(count, -1) if len(chunk) >= self.window \
+            else chunk.reshape(1, -1)
+        power = np.einsum('ij,ij->i', windows, windows) / max(windows.shape[1], 1)
+        loudest = 10.0 * np.log10(float(power.max()) + 1e-12)
+        peak = max(float(chunk.max()), -float(chunk.min())) if len(chunk) else 0.0
+        return loudest, 20.0 * np.log10(peak + 1e-12)
+
+    def classify(self, chunk):
+        """True si ``chunk`` es silencio; actualiza el estado de histéresis."""
+        loudest, peak = self.measure(chunk)
+        threshold = self.threshold_db + (self.hysteresis_db if self.silent else 0.0)
+        self.silent = loudest < threshold and peak < self.peak_db
+        return self.silent
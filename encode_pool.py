@@ -0,0 +1,106 @@
+"""
+Pool acotado de hilos para codificar chunks fuera del hilo que los corta.
+
+Los resultados se entregan en el orden en que se enviaron los trabajos, así
+que la subida conserva el orden de los chunks aunque uno corto termine de
+codificarse antes que otro largo. El pool sirve para que el hilo que corta
+no espere a la codificación, no para codificar en paralelo: lameenc no
+libera el GIL y dos codificaciones en hilos tardan lo mismo que seguidas.
+La mayor parte del chunk ya llega codificada en streaming y aquí sólo se
+completa, así que más hilos apenas acortan la cola.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class EncodePool:
+    """Ejecuta trabajos de codificación y pasa sus resultados a ``deliver`` en orden.
+
+    Admite como mucho ``max_pending`` trabajos sin entregar; ``submit`` espera
+    a que se libere uno si se alcanza el límite (el buffer de la mezcla
+    absorbe la espera) y el tiempo bloqueado se contabiliza en las métricas.
+    """
+
+    def __init__(self, workers, deliver, max_pending=None):
+        self.workers = max(int(workers), 1)
+        self.max_pending = max_pending or self.workers * 2
+        self._deliver = deliver
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='encode')
+        self._slots = threading.Semaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = deque()  # Futuros en orden de envío, aún sin entregar
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0  # Tiempo que ``submit`` esperó por un hueco
+        self.encode_seconds = 0.0   # Suma de la duración de los trabajos
+        self.max_encode_seconds = 0.0
+
+    def depth(self):
+        """Trabajos enviados que todavía no se han entregado."""
+        return len(self._pending)
+
+    def submit(self, job, *args):
+        """Encola ``job(*args)``; su resultado se entregará tras los anteriores."""
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self._slots.acquire()
+            self.blocked_seconds += time.perf_counter() - start
+        with self._lock:
+            future = self._executor.submit(self._timed, job, *args)
+            self._pending.append(future)
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._pending))
+        future.add_done_callback(self._on_done)
+        return future
+
+    @staticmethod
+    def _timed(job, *args):
+        start = time.perf_counter()
+        result = job(*args)
+        return result, time.perf_counter() - start
+
+    def _on_done(self, _future):
+        # Entregar los trabajos terminados del frente de la cola; el lock
+        # garantiza el orden aunque varios terminen a la vez
+        with self._lock:
+            while self._pending and self._pending[0].done():
+                future = self._pending.popleft()
+                self._slots.release()
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Error codificando chunk: {e}")
+                    continue
+                self.encode_seconds += elapsed
+                self.max_encode_seconds = max(self.max_encode_seconds, elapsed)
+                try:
+                    self._deliver(result)
+                except Exception as e:
+                    logger.error(f"Error entregando chunk: {e}")
+                self.delivered += 1
+
+    def stats(self):
+        """Métricas de la cola de codificación."""
+        return {
+            'workers': self.workers,
+            'queue_depth': self.depth(),
+            'max_queue_depth': self.max_depth,
+            'submitted': self.submitted,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'encode_ms_avg': round(self.encode_seconds / self.delivered * 1000, 1) if self.delivered else 0.0,
+            'encode_ms_max': round(self.max_encode_seconds * 1000, 1),
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+    def close(self):
+        """Espera a que se codifiquen y entreguen todos los trabajos pendientes."""
+        self._executor.shutdown(wait=True)
@@ -15,9 +15,11 @@ from PySide6.QtWidgets import (
 )
 
 # Importaciones locales
-from audio_handler import AudioRecorder
+from audio_handler import AudioRecorder, DEFAULT_SAMPLE_RATE, SUPPORTED_SAMPLE_RATES
 from audio_device_tester import AudioDeviceTester, get_audio_devices
-from utils import load_config, save_config
+from utils import load_config, save_config, WebhookClient
+from upload_spool import UploadSpool, SpoolRetrier
+from stream_cache import StreamConfigCache
 
 # Importaciones de audio
 import sounddevice as sd
@@ -27,6 +29,16 @@ from scipy.io import wavfile
 ASSETS = os.path.join(os.path.dirname(__file__), "assets")
 STYLE_PATH = os.path.join(ASSETS, "styles", "style.qss")
 
+def webhook_options(config):
+    """Opciones de WebhookClient según la configuración (grabación y reenvíos del spool)."""
+    return {
+        'pool_size': config.get('upload_pool_size', 2),
+        'keep_alive': config.get('upload_keep_alive', True),
+        'connect_timeout': config.get('upload_connect_timeout', 3.05),
+        'read_timeout': config.get('upload_read_timeout', 10.0),
+        'read_timeout_per_mb': config.get('upload_read_timeout_per_mb', 10.0),
+    }
+
 class DeviceTestThread(QThread):
     """Hilo para probar dispositivos de audio con grabación de 3 segundos."""
     test_completed = QtSignal(dict)
@@ -162,6 +174,12 @@ class DeviceTestThread(QThread):
                 {'channels': min(device_info['max_input_channels'], 2), 'dtype': 'float32', 'samplerate': 44100},
             ]
             
+            # Si ya conocemos una configuración válida para este dispositivo, probarla primero
+            stream_cache = StreamConfigCache()
+            cached = stream_cache.lookup(self.device_id)
+            if cached:
+                configs_to_try.insert(0, cached)
+            
             duration = 3.0  # 3 segundos para el test
             
             for i, config in enumerate(configs_to_try):
@@ -221,6 +239,8 @@ class DeviceTestThread(QThread):
                     if status in ['success', 'warning'] or i == len(configs_to_try) - 1:
                         
                         if status in ['success', 'warning']:
+                            stream_cache.store(self.device_id, config)
+                            
                             # Guardar archivo temporal
                             temp_dir = Path(tempfile.gettempdir()) / "audio_test"
                             temp_dir.mkdir(exist_ok=True)
@@ -257,6 +277,8 @@ class DeviceTestThread(QThread):
                         
                 except Exception as config_error:
                     # Esta configuración falló, probar la siguiente
+                    if config is cached:
+                        stream_cache.invalidate(self.device_id)
                     self.test_progress.emit(f"❌ Configuración {i+1} falló: {str(config_error)}")
                     continue
             
@@ -465,6 +487,46 @@ class ConfigPanel(QWidget):
         duration_layout.addWidget(self.duration_spin)
         duration_layout.addStretch()
         
+        # Corte de chunks en pausas de voz (la duración pasa a ser orientativa)
+        self.vad_checkbox = QCheckBox("✂️ Cortar chunks en pausas de voz")
+        self.vad_checkbox.setToolTip("Corta entre la mitad y 1.5 veces la duración, en la primera pausa")
+        
+        # Frecuencia de muestreo del pipeline (chunks enviados al webhook)
+        sample_rate_layout = QHBoxLayout()
+        sample_rate_label = QLabel("🎚️ Frecuencia de muestreo:")
+        sample_rate_label.setStyleSheet("font-weight: bold; font-size: 12px;")
+        self.sample_rate_combo = QComboBox()
+        for rate in SUPPORTED_SAMPLE_RATES:
+            label = f"{rate / 1000:g} kHz"
+            self.sample_rate_combo.addItem(f"{label} (voz)" if rate == 16000 else label, rate)
+        self.sample_rate_combo.setCurrentIndex(self.sample_rate_combo.findData(DEFAULT_SAMPLE_RATE))
+        sample_rate_layout.addWidget(sample_rate_label)
+        sample_rate_layout.addWidget(self.sample_rate_combo)
+        sample_rate_layout.addStretch()
+        
+        # Qué hacer con los chunks silenciosos
+        silence_layout = QHBoxLayout()
+        silence_label = QLabel("🔇 Chunks en silencio:")
+        silence_label.setStyleSheet("font-weight: bold; font-size: 12px;")
+        self.silence_combo = QComboBox()
+        for policy, label in (('send', "Enviar"), ('marker', "Enviar marcador"), ('skip', "Omitir")):
+            self.silence_combo.addItem(label, policy)
+        silence_layout.addWidget(silence_label)
+        silence_layout.addWidget(self.silence_combo)
+        silence_layout.addStretch()
+        
+        # Formato de los chunks enviados
+        codec_layout = QHBoxLayout()
+        codec_label = QLabel("🎼 Formato:")
+        codec_label.setStyleSheet("font-weight: bold; font-size: 12px;")
+        self.codec_combo = QComboBox()
+        for codec, label in (('mp3', "MP3"), ('opus', "Opus (voz, ~8x menos datos)"),
+                             ('flac', "FLAC (sin pérdidas)"), ('wav', "WAV")):
+            self.codec_combo.addItem(label, codec)
+        codec_layout.addWidget(codec_label)
+        codec_layout.addWidget(self.codec_combo)
+        codec_layout.addStretch()
+        
         # Botones de acción
         buttons_layout = QHBoxLayout()
         
@@ -518,6 +580,10 @@ class ConfigPanel(QWidget):
         layout.addLayout(webhook_layout)
         layout.addSpacing(5)
         layout.addLayout(duration_layout)
+        layout.addWidget(self.vad_checkbox)
+        layout.addLayout(sample_rate_layout)
+        layout.addLayout(silence_layout)
+        layout.addLayout(codec_layout)
         layout.addStretch()
         layout.addLayout(buttons_layout)
         
@@ -611,6 +677,19 @@ class ConfigPanel(QWidget):
         if 'chunk_duration' in config:
             self.duration_spin.setValue(config.get('chunk_duration', 4))
             
+        self.vad_checkbox.setChecked(config.get('chunk_mode') == 'vad')
+            
+        if 'sample_rate' in config:
+            index = self.sample_rate_combo.findData(config['sample_rate'])
+            if index >= 0:
+                self.sample_rate_combo.setCurrentIndex(index)
+            
+        index = self.silence_combo.findData(config.get('silence_policy', 'send'))
+        self.silence_combo.setCurrentIndex(max(index, 0))
+        
+        index = self.codec_combo.findData(config.get('codec', 'mp3'))
+        self.codec_combo.setCurrentIndex(max(index, 0))
+            
         # Cargar configuración de fuentes de grabación
         if 'record_microphone' in config:
             self.record_mic_checkbox.setChecked(config['record_microphone'])
@@ -630,12 +709,19 @@ class ConfigPanel(QWidget):
         if self.output_combo.currentIndex() >= 0:
             output_dev_id, _ = self.output_combo.currentData()
         
-        config = {
+        # Partir de la configuración guardada para conservar las claves que
+        # no se editan desde la UI (p. ej. la lista de fuentes ``sources``)
+        config = load_config()
+        config.update({
             'input_device': input_dev_id,
             'output_device': output_dev_id,
             'webhook_url': self.webhook_edit.text().strip(),
-            'chunk_duration': self.duration_spin.value()
-        }
+            'chunk_duration': self.duration_spin.value(),
+            'sample_rate': self.sample_rate_combo.currentData(),
+            'chunk_mode': 'vad' if self.vad_checkbox.isChecked() else 'fixed',
+            'silence_policy': self.silence_combo.currentData(),
+            'codec': self.codec_combo.currentData()
+        })
         
         # Agregar configuración de fuentes de grabación
         config['record_microphone'] = self.record_mic_checkbox.isChecked()
@@ -864,9 +950,22 @@ class MainWindow(QWidget):
         self.recording_start_time = 0
         
         # Cargar configuración y verificar dispositivos
-        self.config_panel.load_from_config(load_config())
+        config = load_config()
+        self.config_panel.load_from_config(config)
         self._check_devices()
         self.update_ui()
+        
+        # Reenviar en segundo plano los chunks que no se pudieron enviar,
+        # también los que quedaron de ejecuciones anteriores
+        self.spool = UploadSpool(
+            max_age_hours=config.get('spool_max_age_hours', 72),
+            max_mb=config.get('spool_max_mb', 500)
+        )
+        # El cliente se crea con la configuración vigente, no la del arranque
+        self.spool_retrier = SpoolRetrier(
+            self.spool, lambda url: WebhookClient(url, **webhook_options(load_config()))
+        )
+        self.spool_retrier.start()
     
     def _create_widgets(self):
         """Crea todos los widgets de la interfaz."""
@@ -1068,7 +1167,8 @@ class MainWindow(QWidget):
     
     def on_rec_btn(self):
         """Maneja el clic en el botón de grabación."""
-        if self.state == "ready":
+        # No se empieza otra grabación mientras la anterior vacía sus envíos
+        if self.state == "ready" and not (self.recorder and self.recorder.isRunning()):
             config = load_config()
             
             # Obtener configuración
@@ -1076,6 +1176,7 @@ class MainWindow(QWidget):
             sys_index = config.get('output_device')
             webhook_url = config.get('webhook_url', '')
             chunk_duration = config.get('chunk_duration', 4)
+            sample_rate = config.get('sample_rate', DEFAULT_SAMPLE_RATE)
             
             # Obtener configuración de fuentes de grabación
             record_microphone = config.get('record_microphone', True)
@@ -1087,12 +1188,39 @@ class MainWindow(QWidget):
             if not record_system:
                 sys_index = None
             
+            # Lista de fuentes con ganancias (config.json), si se definió
+            sources = config.get('sources') or None
+            
+            upload = webhook_options(config)
+            
             # Crear y configurar el recorder
             self.recorder = AudioRecorder(
                 mic_index=mic_index,
                 sys_index=sys_index,
                 webhook_url=webhook_url,
-                chunk_duration=chunk_duration
+                chunk_duration=chunk_duration,
+                sources=sources,
+                sample_rate=sample_rate,
+                chunk_mode=config.get('chunk_mode', 'fixed'),
+                chunk_min_duration=config.get('chunk_min_duration'),
+                chunk_max_duration=config.get('chunk_max_duration'),
+                silence_policy=config.get('silence_policy', 'send'),
+                silence_threshold_db=config.get('silence_threshold_db', -50.0),
+                chunk_overlap=config.get('chunk_overlap', 0.0),
+                encode_workers=config.get('encode_workers', 2),
+                codec=config.get('codec', 'mp3'),
+                codec_bitrate=config.get('codec_bitrate'),
+                upload_pool_size=upload['pool_size'],
+                upload_keep_alive=upload['keep_alive'],
+                upload_connect_timeout=upload['connect_timeout'],
+                upload_read_timeout=upload['read_timeout'],
+                upload_read_timeout_per_mb=upload['read_timeout_per_mb'],
+                upload_workers=config.get('upload_workers', 1),
+                upload_queue_size=config.get('upload_queue_size', 8),
+                upload_policy=config.get('upload_policy', 'block'),
+                upload_drain_timeout=config.get('upload_drain_timeout', 30.0),
+                spool=self.spool,
+                strict_ordering=config.get('upload_strict_ordering', False)
             )
             
             # Conectar señales
@@ -1101,6 +1229,7 @@ class MainWindow(QWidget):
             self.recorder.status_update.connect(self.show_status)
             self.recorder.finished_sending.connect(self.on_finished_sending)
             self.recorder.error_occurred.connect(self.on_error)
+            self.recorder.finished.connect(self.on_recorder_finished)
             
             # Iniciar grabación
             self.recorder.start()
@@ -1110,9 +1239,11 @@ class MainWindow(QWidget):
     def on_stop_btn(self):
         """Maneja el clic en el botón de parar."""
         if self.state == "recording" and self.recorder:
+            # El hilo termina de enviar en segundo plano; on_recorder_finished
+            # vuelve a "ready" cuando acaba de verdad
             self.recorder.stop_recording()
-            self.recorder.wait(3000)
-            self.state = "ready"
+            self.recording_timer.stop()
+            self.state = "sending"
             self.update_ui()
     
     def on_recording_started(self):
@@ -1130,6 +1261,15 @@ class MainWindow(QWidget):
         self.state = "ready"
         self.update_ui()
     
+    def on_recorder_finished(self):
+        """Se ejecuta cuando el hilo de grabación termina (envíos incluidos)."""
+        if self.sender() is not self.recorder:
+            return
+        self.recording_timer.stop()
+        self.recording_time.setText("00:00")
+        self.state = "ready"
+        self.update_ui()
+    
     def on_finished_sending(self, success, chunk_id):
         """Se ejecuta cuando se envía un chunk."""
         if success:
@@ -1140,8 +1280,10 @@ class MainWindow(QWidget):
     def on_error(self, msg):
         """Se ejecuta cuando hay un error."""
         self.show_status(f"Error: {msg}", error=True)
-        self.state = "ready"
-        self.update_ui()
+        # Si el hilo sigue vivo, on_recorder_finished cambiará el estado al terminar
+        if not (self.recorder and self.recorder.isRunning()):
+            self.state = "ready"
+            self.update_ui()
     
     def update_recording_time(self):
         """Actualiza el tiempo de grabación."""
@@ -1188,8 +1330,12 @@ class MainWindow(QWidget):
     def close_application(self):
         """Cierra la aplicación completamente."""
         if self.recorder and self.recorder.isRunning():
+            # Ocultar la ventana y dejar que el hilo vacíe su cola de envíos;
+            # lo que no salga a tiempo queda en el spool
+            self.hide()
             self.recorder.stop_recording()
-            self.recorder.wait(2000)
+            self.recorder.wait(int((self.recorder.stop_timeout() + 5.0) * 1000))
+        self.spool_retrier.stop()
         QApplication.quit()
     
     def resizeEvent(self, event):
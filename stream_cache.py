@@ -0,0 +1,99 @@
+"""
+Caché persistente de la configuración de stream que funciona en cada dispositivo.
+
+Evita repetir en cada grabación la prueba de combinaciones de canales, dtype y
+sample rate: la primera configuración que abre correctamente se guarda en
+*stream_cache.json*, indexada por nombre de dispositivo + host API, y se valida
+con ``sd.check_input_settings`` antes de reutilizarla.
+"""
+import json
+import logging
+import os
+import threading
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "stream_cache.json")
+
+logger = logging.getLogger(__name__)
+
+
+class StreamConfigCache:
+    """Configuraciones de stream conocidas por dispositivo."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+
+    @staticmethod
+    def device_key(device_index):
+        """Clave estable del dispositivo: los índices cambian entre sesiones."""
+        import sounddevice as sd  # Diferido: el módulo se importa sin PortAudio
+        info = sd.query_devices(device_index)
+        hostapi = sd.query_hostapis(info['hostapi'])['name']
+        return f"{info['name']}|{hostapi}"
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (IOError, ValueError) as exc:
+            logger.warning("Caché de streams ilegible, se ignora: %s", exc)
+            return {}
+
+    def _write(self, data):
+        try:
+            with open(self.path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp, indent=2, ensure_ascii=False)
+        except IOError as exc:
+            logger.warning("No se pudo guardar la caché de streams: %s", exc)
+
+    def lookup(self, device_index):
+        """Devuelve la configuración guardada si sigue siendo válida, o None."""
+        try:
+            key = self.device_key(device_index)
+        except Exception:
+            return None
+        with self._lock:
+            config = self._read().get(key)
+        if not config:
+            return None
+        try:
+            import sounddevice as sd
+            sd.check_input_settings(
+                device=device_index,
+                channels=config['channels'],
+                dtype=config['dtype'],
+                samplerate=config['samplerate']
+            )
+        except Exception as exc:
+            logger.info("Configuración en caché de '%s' ya no es válida: %s", key, exc)
+            self.invalidate(device_index)
+            return None
+        return dict(config)
+
+    def store(self, device_index, config):
+        """Guarda la configuración que acaba de abrir correctamente."""
+        try:
+            key = self.device_key(device_index)
+        except Exception:
+            return
+        entry = {name: config[name] for name in ('channels', 'dtype', 'samplerate', 'latency')
+                 if name in config}
+        with self._lock:
+            data = self._read()
+            if data.get(key) != entry:
+                data[key] = entry
+                self._write(data)
+
+    def invalidate(self, device_index):
+        """Elimina la configuración guardada tras un fallo al abrirla."""
+        try:
+            key = self.device_key(device_index)
+        except Exception:
+            return
+        with self._lock:
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import numpy as np
+
+from audio_buffer import ChunkAccumulator, RingBuffer, Wakeup
+
+
+def test_wraps_around_the_end_of_the_array():
+    ring = RingBuffer(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    assert np.array_equal(ring.read(5), np.arange(5))
+    assert ring.write(np.arange(6, 13, dtype=np.float32)) == 7
+    assert ring.available() == 8 and ring.free() == 0
+    assert np.array_equal(ring.read(), np.arange(5, 13))
+    assert ring.overruns == 0
+
+
+def test_counts_overruns_and_keeps_the_oldest_data():
+    ring = RingBuffer(4)
+    assert ring.write(np.arange(6, dtype=np.float32)) == 4
+    assert ring.overruns == 2
+    assert ring.write(np.ones(3, dtype=np.float32)) == 0
+    assert ring.overruns == 5
+    assert np.array_equal(ring.read(), np.arange(4))
+
+
+def test_read_into_limits_to_available_and_to_out():
+    ring = RingBuffer(8)
+    ring.write(np.arange(5, dtype=np.float32))
+    out = np.zeros(3, dtype=np.float32)
+    assert ring.read_into(out) == 3
+    assert np.array_equal(out, [0, 1, 2])
+    out = np.zeros(10, dtype=np.float32)
+    assert ring.read_into(out) == 2
+    assert ring.read_into(out) == 0
+
+
+def test_multichannel_and_mono_from_first_channel():
+    stereo = RingBuffer(4, channels=2, dtype=np.int16)
+    block = np.arange(6, dtype=np.int16).reshape(3, 2)
+    stereo.write(block)
+    assert np.array_equal(stereo.read(), block)
+    mono = RingBuffer(4)
+    mono.write(block.astype(np.float32))
+    assert np.array_equal(mono.read(), [0, 2, 4])
+
+
+def test_clear_discards_pending_data():
+    ring = RingBuffer(4)
+    ring.write(np.ones(3, dtype=np.float32))
+    ring.clear()
+    assert ring.available() == 0 and ring.free() == 4
+
+
+def test_long_random_stream_survives_many_wraps():
+    rng = np.random.default_rng(1)
+    ring = RingBuffer(97)
+    source = rng.standard_normal(20000).astype(np.float32)
+    written = 0
+    received = []
+    while written < len(source) or ring.available():
+        size = min(int(rng.integers(0, 60)), ring.free())
+        written += ring.write(source[written:written + size])
+        received.append(ring.read(int(rng.integers(0, 60))))
+    assert ring.overruns == 0
+    assert np.array_equal(np.concatenate(received), source)
+
+
+def test_producer_and_consumer_threads_without_locks():
+    ring = RingBuffer(1024)
+    source = np.arange(200000, dtype=np.float32)
+    received = []
+
+    def produce():
+        written = 0
+        while written < len(source):
+            written += ring.write(source[written:written + 256])
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    total = 0
+    while total < len(source):
+        block = ring.read(300)
+        total += len(block)
+        received.append(block)
+    producer.join()
+    assert np.array_equal(np.concatenate(received), source)
+
+
+def test_wakeup_only_touches_the_event_when_the_consumer_waits():
+    wakeup = Wakeup()
+    ring = RingBuffer(16, notify=wakeup)
+    wakeup.clear()
+    ring.write(np.ones(4, dtype=np.float32))
+    assert not wakeup._event.is_set()
+    # El aviso queda pendiente: wait no duerme aunque el Event no se activara
+    start = time.monotonic()
+    wakeup.wait(timeout=5)
+    assert time.monotonic() - start < 1
+
+
+def test_wakeup_consumer_never_misses_a_block():
+    wakeup = Wakeup()
+    ring = RingBuffer(1024, notify=wakeup)
+    source = np.arange(100000, dtype=np.float32)
+    received = []
+
+    def produce():
+        written = 0
+        while written < len(source):
+            written += ring.write(source[written:written + 128])
+            time.sleep(0)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    total = 0
+    while total < len(source):
+        wakeup.clear()
+        block = ring.read()
+        if len(block):
+            total += len(block)
+            received.append(block)
+            continue
+        # Con un aviso perdido el consumidor se quedaría esperando el timeout
+        start = time.monotonic()
+        wakeup.wait(timeout=5)
+        assert time.monotonic() - start < 1
+    producer.join()
+    assert np.array_equal(np.concatenate(received), source)
+
+
+def test_accumulator_take_keeps_overlap_and_recycles_buffers():
+    ring = RingBuffer(32)
+    ring.write(np.arange(10, dtype=np.float32))
+    accumulator = ChunkAccumulator(8)
+    assert accumulator.fill_from(ring) == 8 and accumulator.full
+    chunk = accumulator.take(6, keep=2)
+    assert np.array_equal(chunk, np.arange(6))
+    assert np.array_equal(accumulator.data, [4, 5, 6, 7])
+    accumulator.recycle(chunk)
+    assert accumulator.fill_from(ring) == 2
+    assert np.array_equal(accumulator.data, [4, 5, 6, 7, 8, 9])
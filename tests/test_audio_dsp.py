@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from audio_dsp import PolyphaseResampler
+
+RATE_PAIRS = [(44100, 48000), (48000, 44100), (48000, 16000), (44100, 16000), (16000, 48000)]
+
+
+def tone(rate, frequency, seconds):
+    t = np.arange(int(rate * seconds)) / rate
+    return np.sin(2 * np.pi * frequency * t).astype(np.float32)
+
+
+def rms_db(signal):
+    return 20 * np.log10(np.sqrt(np.mean(signal.astype(np.float64) ** 2)) + 1e-12)
+
+
+@pytest.mark.parametrize("in_rate,out_rate", RATE_PAIRS)
+def test_block_splits_match_a_single_call(in_rate, out_rate):
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal(in_rate // 2).astype(np.float32)
+    whole = PolyphaseResampler(in_rate, out_rate).process(signal)
+
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    cuts = np.sort(rng.integers(0, len(signal), 40))
+    parts = [resampler.process(block) for block in np.split(signal, cuts)]
+    split = np.concatenate(parts)
+
+    assert len(split) == len(whole) == resampler.output_count
+    assert np.max(np.abs(split - whole)) < 1e-5
+
+
+@pytest.mark.parametrize("in_rate,out_rate", RATE_PAIRS)
+def test_output_count_follows_the_rate_ratio(in_rate, out_rate):
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    total = 0
+    for size in (0, 1, 999, 4096, 12345):
+        total += size
+        resampler.process(np.zeros(size, dtype=np.float32))
+        assert resampler.output_count == -(-total * out_rate // in_rate)
+
+
+def test_same_rate_passes_samples_through():
+    resampler = PolyphaseResampler(44100, 44100)
+    block = np.random.default_rng(2).standard_normal(1000).astype(np.float32)
+    assert np.array_equal(resampler.process(block), block)
+    assert resampler.delay == 0.0
+
+
+@pytest.mark.parametrize("in_rate,out_rate,frequency", [(48000, 16000, 1000), (44100, 48000, 5000)])
+def test_passband_tone_keeps_its_level(in_rate, out_rate, frequency):
+    output = PolyphaseResampler(in_rate, out_rate).process(tone(in_rate, frequency, 1.0))
+    steady = output[out_rate // 10:-out_rate // 10]
+    assert abs(rms_db(steady) - rms_db(tone(out_rate, frequency, 1.0))) < 0.1
+
+
+@pytest.mark.parametrize("in_rate,out_rate,frequency", [
+    (48000, 16000, 8500), (48000, 16000, 12000), (48000, 44100, 23000), (44100, 16000, 10000),
+])
+def test_tones_above_the_output_nyquist_are_rejected(in_rate, out_rate, frequency):
+    output = PolyphaseResampler(in_rate, out_rate).process(tone(in_rate, frequency, 1.0))
+    steady = output[out_rate // 10:-out_rate // 10]
+    assert rms_db(steady) - rms_db(tone(in_rate, frequency, 1.0)) < -70
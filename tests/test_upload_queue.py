@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from upload_queue import UploadQueue
+
+
+class Recorder:
+    """``send`` de prueba: anota inicio y fin de cada envío y puede retenerlos."""
+
+    def __init__(self, delays=None, results=None):
+        self.delays = delays or {}
+        self.results = results or {}
+        self.lock = threading.Lock()
+        self.started = []
+        self.finished = []
+        self.active = 0
+        self.max_active = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, item):
+        with self.lock:
+            self.started.append(item)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.gate.wait()
+        time.sleep(self.delays.get(item, 0.0))
+        with self.lock:
+            self.active -= 1
+            self.finished.append(item)
+        result = self.results.get(item, True)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condición no alcanzada"
+        time.sleep(0.005)
+
+
+def test_single_worker_sends_in_order():
+    send = Recorder()
+    queue = UploadQueue(1, send, max_pending=100)
+    for item in range(20):
+        queue.submit(item)
+    assert queue.close() == []
+    assert send.finished == list(range(20))
+    assert queue.stats()['sent'] == 20
+    assert send.max_active == 1
+
+
+def test_workers_overlap_and_short_items_can_overtake():
+    send = Recorder(delays={0: 0.2})
+    queue = UploadQueue(2, send, max_pending=10)
+    queue.submit(0)
+    queue.submit(1)
+    queue.close()
+    assert send.finished == [1, 0]
+    assert send.max_active == 2
+
+
+def test_barriers_wait_for_every_earlier_item():
+    send = Recorder(delays={0: 0.2, 2: 0.1})
+    queue = UploadQueue(3, send, max_pending=10)
+    for item in range(5):
+        queue.submit(item, barrier=True)
+    queue.close()
+    assert send.finished == list(range(5))
+    assert send.max_active == 1
+
+
+def test_barrier_waits_for_in_flight_items_only_before_it():
+    send = Recorder(delays={0: 0.2})
+    queue = UploadQueue(2, send, max_pending=10)
+    queue.submit(0)
+    queue.submit(1, barrier=True)
+    queue.submit(2)
+    queue.close()
+    assert send.started.index(1) > 0
+    assert send.finished.index(0) < send.started.index(1)
+
+
+def test_block_policy_waits_for_room():
+    send = Recorder()
+    send.gate.clear()
+    queue = UploadQueue(1, send, max_pending=1, policy='block')
+    queue.submit(0)
+    wait_for(lambda: send.started == [0])
+    queue.submit(1)  # Ocupa la cola; el siguiente debe esperar
+    threading.Timer(0.2, send.gate.set).start()
+    queue.submit(2)
+    queue.close()
+    assert send.finished == [0, 1, 2]
+    assert queue.stats()['blocked_seconds'] >= 0.1
+
+
+def test_spill_policy_hands_the_new_item_over():
+    send = Recorder()
+    send.gate.clear()
+    spilled = []
+    queue = UploadQueue(1, send, max_pending=1, policy='spill', spill=spilled.append)
+    queue.submit(0)
+    wait_for(lambda: send.started == [0])
+    queue.submit(1)
+    queue.submit(2)
+    send.gate.set()
+    queue.close()
+    assert spilled == [2]
+    assert send.finished == [0, 1]
+    assert queue.stats()['spilled'] == 1
+
+
+def test_drop_oldest_policy_discards_the_oldest_waiting_item():
+    send = Recorder()
+    send.gate.clear()
+    dropped = []
+    queue = UploadQueue(1, send, max_pending=2, policy='drop_oldest', drop=dropped.append)
+    queue.submit(0)
+    wait_for(lambda: send.started == [0])
+    for item in (1, 2, 3):
+        queue.submit(item)
+    send.gate.set()
+    queue.close()
+    assert dropped == [1]
+    assert send.finished == [0, 2, 3]
+    assert queue.stats()['dropped'] == 1
+
+
+def test_unknown_policy_falls_back_to_block():
+    queue = UploadQueue(1, Recorder(), policy='nope')
+    assert queue.policy == 'block'
+    queue.close()
+
+
+def test_close_timeout_returns_items_that_never_started():
+    send = Recorder()
+    send.gate.clear()
+    queue = UploadQueue(1, send, max_pending=10)
+    for item in range(4):
+        queue.submit(item)
+    wait_for(lambda: send.started == [0])
+    assert queue.close(timeout=0.1) == [(1,), (2,), (3,)]
+    assert queue.in_flight == 1
+    send.gate.set()
+    wait_for(lambda: queue.in_flight == 0)
+    assert send.finished == [0]
+
+
+def test_submit_after_close_goes_to_spill():
+    spilled = []
+    queue = UploadQueue(1, Recorder(), spill=spilled.append)
+    queue.close()
+    queue.submit(7)
+    assert spilled == [7]
+
+
+@pytest.mark.parametrize("result", [False, RuntimeError("boom")])
+def test_failed_sends_are_counted(result):
+    send = Recorder(results={1: result})
+    queue = UploadQueue(1, send)
+    for item in range(3):
+        queue.submit(item)
+    queue.close()
+    stats = queue.stats()
+    assert (stats['sent'], stats['failed']) == (2, 1)
@@ -0,0 +1,152 @@
+import time
+
+import pytest
+
+from audio_codecs import EncodedChunk
+from upload_spool import PERMANENT_STATUS, SpoolRetrier, UploadSpool
+
+
+class FakeClient:
+    """Cliente de webhook que responde según ``statuses`` y anota los envíos."""
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.sent = []
+
+    def send(self, final_chunk, metadata=None, data=None, filename=None, content_type=None,
+             with_status=False):
+        key = (metadata['session_id'], metadata['sequence'])
+        self.sent.append(key)
+        status = self.statuses.get(key, 200)
+        result = (status < 300, f"HTTP {status}", status)
+        return result if with_status else result[:2]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return UploadSpool(str(tmp_path), base_delay=1.0, max_delay=4.0)
+
+
+def add(spool, session, sequence, created, next_attempt=0.0, size=10):
+    """Añade una entrada y fija su creación y su próximo intento."""
+    metadata = {'session_id': session, 'sequence': sequence}
+    chunk = EncodedChunk(f"final_{sequence:04d}.mp3", b"x" * size, "audio/mpeg")
+    entry_id = spool.add("http://webhook", session, f"chunk_{sequence:04d}", chunk, metadata=metadata)
+    data = spool._read()
+    data[entry_id]['created'] = created
+    data[entry_id]['next_attempt'] = next_attempt
+    spool._write(data)
+    return entry_id
+
+
+def ids(entries):
+    return [entry['id'] for entry in entries]
+
+
+def test_pending_orders_by_session_age_then_sequence(spool):
+    now = time.time()
+    add(spool, "b", 1, now - 10)
+    add(spool, "a", 2, now - 50)
+    add(spool, "b", 0, now - 5)
+    add(spool, "a", 0, now - 20)
+    assert ids(spool.pending()) == ["a_chunk_0000", "a_chunk_0002", "b_chunk_0000", "b_chunk_0001"]
+
+
+def test_hold_hides_entries_from_sequence_until_release(spool):
+    now = time.time()
+    for sequence in range(3):
+        add(spool, "a", sequence, now)
+    spool.hold("a", 1)
+    assert ids(spool.pending()) == ["a_chunk_0000"]
+    spool.release("a")
+    assert len(spool.pending()) == 3
+
+
+def test_next_due_in_only_counts_session_heads(spool):
+    now = time.time()
+    assert spool.next_due_in() is None
+    add(spool, "a", 0, now, next_attempt=now + 30)
+    add(spool, "a", 1, now, next_attempt=0.0)  # Vencida, pero detrás de la primera
+    assert 25 < spool.next_due_in() <= 30
+    add(spool, "b", 0, now + 1, next_attempt=0.0)
+    assert spool.next_due_in() == 0.0
+
+
+def test_failure_stops_only_its_session(spool):
+    now = time.time()
+    for sequence in range(3):
+        add(spool, "a", sequence, now - 20)
+        add(spool, "b", sequence, now - 10)
+    client = FakeClient({("a", 1): 503})
+    SpoolRetrier(spool, lambda url: client)._retry_due()
+    assert client.sent == [("a", 0), ("a", 1), ("b", 0), ("b", 1), ("b", 2)]
+    remaining = spool.pending()
+    assert ids(remaining) == ["a_chunk_0001", "a_chunk_0002"]
+    assert remaining[0]['attempts'] == 2
+    assert remaining[0]['next_attempt'] > now
+
+
+def test_entry_not_due_blocks_the_rest_of_its_session(spool):
+    now = time.time()
+    add(spool, "a", 0, now)
+    add(spool, "a", 1, now, next_attempt=now + 60)
+    add(spool, "a", 2, now)
+    client = FakeClient()
+    SpoolRetrier(spool, lambda url: client)._retry_due()
+    assert client.sent == [("a", 0)]
+    assert ids(spool.pending()) == ["a_chunk_0001", "a_chunk_0002"]
+
+
+@pytest.mark.parametrize("status", PERMANENT_STATUS)
+def test_permanent_rejection_is_discarded(spool, status):
+    now = time.time()
+    add(spool, "a", 0, now)
+    add(spool, "a", 1, now)
+    client = FakeClient({("a", 0): status})
+    SpoolRetrier(spool, lambda url: client)._retry_due()
+    assert client.sent == [("a", 0), ("a", 1)]
+    assert spool.pending() == []
+
+
+@pytest.mark.parametrize("status", [401, 403, 404, 408, 429, 500])
+def test_other_errors_stay_in_the_spool(spool, status):
+    now = time.time()
+    add(spool, "a", 0, now)
+    add(spool, "a", 1, now)
+    client = FakeClient({("a", 0): status})
+    SpoolRetrier(spool, lambda url: client)._retry_due()
+    assert client.sent == [("a", 0)]
+    assert ids(spool.pending()) == ["a_chunk_0000", "a_chunk_0001"]
+
+
+def test_missing_audio_file_is_dropped(spool, tmp_path):
+    now = time.time()
+    add(spool, "a", 0, now)
+    add(spool, "a", 1, now)
+    (tmp_path / "a_chunk_0000.mp3").unlink()
+    client = FakeClient()
+    SpoolRetrier(spool, lambda url: client)._retry_due()
+    assert client.sent == [("a", 1)]
+    assert spool.pending() == []
+
+
+def test_expire_drops_old_entries_and_oldest_over_size(tmp_path):
+    spool = UploadSpool(str(tmp_path), max_age_hours=1.0, max_mb=25 / (1024 * 1024))
+    now = time.time()
+    add(spool, "a", 0, now - 7200)
+    add(spool, "b", 0, now - 30)
+    add(spool, "b", 1, now - 20)
+    add(spool, "b", 2, now - 10)
+    assert spool.expire() == 2
+    assert ids(spool.pending()) == ["b_chunk_0001", "b_chunk_0002"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "b_chunk_0001.mp3", "b_chunk_0002.mp3", "index.json"]
+
+
+def test_backoff_grows_and_is_capped(spool):
+    for attempts, delay in [(1, 1.0), (2, 2.0), (3, 4.0), (10, 4.0)]:
+        for _ in range(20):
+            assert delay / 2 <= spool.backoff(attempts) <= delay
@@ -0,0 +1,164 @@
+"""
+Cola acotada de envíos al webhook atendida por un número fijo de hilos.
+
+Los chunks codificados esperan aquí su envío. Si el webhook va lento la cola
+no crece sin límite: al llenarse se aplica una política configurable
+(esperar, guardar en disco o descartar el más antiguo). Al terminar la
+grabación la cola se vacía ordenadamente antes de cerrar.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_POLICIES = ('block', 'spill', 'drop_oldest')
+
+
+class UploadQueue:
+    """Ejecuta ``send(*item)`` para cada elemento encolado con ``workers`` hilos.
+
+    Con un solo hilo los envíos salen en el orden de llegada. Como mucho
+    ``max_pending`` elementos esperan turno; al llegar otro con la cola
+    llena, según ``policy``:
+
+    - ``'block'``: ``submit`` espera a que haya hueco (frena la codificación,
+      y el buffer de la mezcla absorbe la espera).
+    - ``'spill'``: el elemento nuevo se pasa a ``spill`` (guardarlo en disco)
+      en lugar de encolarlo.
+    - ``'drop_oldest'``: se descarta el elemento más antiguo sin enviar y se
+      pasa a ``drop``.
+
+    Los elementos empiezan a enviarse en orden de llegada; uno encolado con
+    ``barrier=True`` espera además a que terminen todos los anteriores, así
+    que si todos lo son los envíos no se solapan y cada uno sale cuando el
+    anterior ya tiene respuesta.
+
+    ``send`` devuelve True si el envío tuvo éxito. Los hilos no son daemon:
+    un envío en curso termina aunque se cierre la aplicación.
+    """
+
+    def __init__(self, workers, send, max_pending=8, policy='block', spill=None, drop=None):
+        if policy not in UPLOAD_POLICIES:
+            logger.warning(f"Política de envío desconocida '{policy}', usando 'block'")
+            policy = 'block'
+        self.workers = max(int(workers), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self.policy = policy
+        self._send = send
+        self._spill = spill
+        self._drop = drop
+        self._queue = deque()  # (elemento, barrera)
+        self._cond = threading.Condition()
+        self._closing = False  # No se aceptan más elementos; los hilos vacían la cola
+        self._aborted = False  # Los hilos terminan tras su envío en curso
+        self.in_flight = 0
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0  # Tiempo que ``submit`` esperó por un hueco
+        self._threads = [threading.Thread(target=self._run, name=f'upload-{i}')
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def depth(self):
+        """Elementos encolados que todavía no empezaron a enviarse."""
+        return len(self._queue)
+
+    def submit(self, *item, barrier=False):
+        """Encola ``item`` para ``send``, aplicando la política si la cola está llena."""
+        overflow = None
+        with self._cond:
+            if self._closing:
+                overflow = item
+            elif len(self._queue) >= self.max_pending:
+                if self.policy == 'block':
+                    start = time.perf_counter()
+                    while len(self._queue) >= self.max_pending and not self._closing:
+                        self._cond.wait()
+                    self.blocked_seconds += time.perf_counter() - start
+                elif self.policy == 'spill':
+                    overflow = item
+                    self.spilled += 1
+                else:
+                    dropped, _ = self._queue.popleft()
+                    self.dropped += 1
+                    if self._drop is not None:
+                        self._drop(*dropped)
+            if overflow is None:
+                self._queue.append((item, barrier))
+                self.submitted += 1
+                self.max_depth = max(self.max_depth, len(self._queue))
+                self._cond.notify_all()
+        if overflow is not None and self._spill is not None:
+            self._spill(*overflow)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._aborted and (not self._queue or self._held()):
+                    if self._closing and not self._queue:
+                        return
+                    self._cond.wait()
+                if self._aborted:
+                    return
+                item, _ = self._queue.popleft()
+                self.in_flight += 1
+                self._cond.notify_all()  # Hay hueco para ``submit``
+            success = False
+            try:
+                success = self._send(*item)
+            except Exception as e:
+                logger.error(f"Error enviando chunk: {e}")
+            with self._cond:
+                self.in_flight -= 1
+                if success:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def _held(self):
+        """True si el siguiente elemento es una barrera y aún hay envíos en curso."""
+        return self._queue[0][1] and self.in_flight > 0
+
+    def stats(self):
+        """Métricas de la cola de envíos."""
+        return {
+            'workers': self.workers,
+            'policy': self.policy,
+            'queue_depth': self.depth(),
+            'in_flight': self.in_flight,
+            'max_queue_depth': self.max_depth,
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'failed': self.failed,
+            'spilled': self.spilled,
+            'dropped': self.dropped,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+    def close(self, timeout=None):
+        """Deja de aceptar elementos y espera a que se envíe lo encolado.
+
+        Si pasan ``timeout`` segundos, los envíos en curso siguen hasta
+        terminar pero los que no empezaron se retiran y se devuelven (para
+        guardarlos); si no, devuelve una lista vacía.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        with self._cond:
+            self._aborted = True
+            pending = [item for item, _ in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+        return pending
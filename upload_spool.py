@@ -0,0 +1,314 @@
+"""
+Spool persistente de chunks que no se pudieron enviar al webhook.
+
+Cada chunk fallido se guarda en *temp_audio/spool/* junto a una entrada en
+*index.json* (sesión, chunk, intentos y próximo intento). ``SpoolRetrier``
+los reenvía con espera exponencial y jitter, también tras reiniciar la
+aplicación, y el spool descarta lo que supera la antigüedad o el tamaño
+máximos. Una caída del webhook durante una reunión ya no pierde audio.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from audio_codecs import EncodedChunk
+
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), "temp_audio", "spool")
+
+# Respuestas que rechazan el propio chunk: reintentarlo no cambiaría nada.
+# Un 404 (workflow de n8n inactivo) o un 401/403 (proxy mal configurado) se
+# arreglan en el servidor, así que esos chunks siguen reintentándose
+PERMANENT_STATUS = (400, 413, 415, 422)
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSpool:
+    """Chunks pendientes de envío en disco, con su índice.
+
+    El índice se reescribe entero (es pequeño) mediante un archivo temporal
+    y ``os.replace``, así que un cierre inesperado no lo deja a medias. El
+    audio se escribe antes que su entrada, así que ninguna queda sin su archivo.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, directory=SPOOL_DIR, max_age_hours=72.0, max_mb=500.0,
+                 base_delay=5.0, max_delay=900.0):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.added = threading.Event()  # Se activa al guardar un chunk nuevo
+        self._held = {}  # Sesión -> primera secuencia que la grabación aún no entregó
+        os.makedirs(directory, exist_ok=True)
+
+    def _read(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (IOError, ValueError) as exc:
+            logger.warning(f"Índice del spool ilegible, se ignora: {exc}")
+            return {}
+
+    def _write(self, data):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                json.dump(data, fp, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except IOError as exc:
+            logger.warning(f"No se pudo guardar el índice del spool: {exc}")
+
+    def backoff(self, attempts):
+        """Segundos hasta el siguiente intento tras ``attempts`` fallos (con jitter)."""
+        delay = min(self.base_delay * 2 ** max(attempts - 1, 0), self.max_delay)
+        return random.uniform(delay / 2, delay)
+
+    def add(self, url, session, chunk_id, chunk, final_chunk=False, metadata=None, error=None):
+        """Guarda un chunk fallido (``chunk`` None: marcador de silencio) para reintentarlo."""
+        entry_id = f"{session}_{chunk_id}"
+        entry = {
+            'url': url,
+            'session': session,
+            'chunk_id': chunk_id,
+            'file': None,
+            'filename': None,
+            'content_type': None,
+            'size': 0,
+            'final_chunk': final_chunk,
+            'metadata': metadata or {},
+            'attempts': 1,
+            'created': time.time(),
+            'next_attempt': time.time() + self.backoff(1),
+            'last_error': error,
+        }
+        if chunk is not None:
+            entry['file'] = entry_id + os.path.splitext(chunk.filename)[1]
+            entry['filename'] = chunk.filename
+            entry['content_type'] = chunk.content_type
+            entry['size'] = len(chunk.data)
+            with open(os.path.join(self.directory, entry['file']), "wb") as fp:
+                fp.write(chunk.data)
+        with self._lock:
+            data = self._read()
+            data[entry_id] = entry
+            self._write(data)
+        self.added.set()
+        return entry_id
+
+    def hold(self, session, sequence):
+        """No reenvía entradas de ``session`` desde ``sequence`` (la grabación aún no lo entregó)."""
+        if self._held.get(session) != sequence:
+            self._held[session] = sequence
+            self.added.set()
+
+    def release(self, session):
+        """Deja reenviar todas las entradas de ``session``."""
+        if self._held.pop(session, None) is not None:
+            self.added.set()
+
+    @staticmethod
+    def _sequence(entry):
+        return entry['metadata'].get('sequence', entry['metadata'].get('chunk_index', 0))
+
+    def pending(self):
+        """Las entradas que se pueden reenviar, por sesión y en orden de secuencia.
+
+        Las sesiones van de la más antigua a la más nueva; dentro de cada una
+        manda la secuencia del envío, no el momento en que llegó al spool.
+        Se omiten las retenidas con ``hold``.
+        """
+        with self._lock:
+            data = self._read()
+        first = {}
+        for entry in data.values():
+            first[entry['session']] = min(first.get(entry['session'], entry['created']), entry['created'])
+        held = dict(self._held)
+        entries = [dict(entry, id=entry_id) for entry_id, entry in data.items()
+                   if self._sequence(entry) < held.get(entry['session'], float('inf'))]
+        return sorted(entries, key=lambda entry: (
+            first[entry['session']], entry['session'], self._sequence(entry)
+        ))
+
+    def next_due_in(self):
+        """Segundos hasta que venza la primera entrada de alguna sesión, o None si el spool está vacío.
+
+        Sólo cuenta la primera entrada de cada sesión: las siguientes esperan
+        a que salga ella, así que vencer antes no adelanta nada.
+        """
+        heads = {}
+        for entry in self.pending():
+            heads.setdefault(entry['session'], entry)
+        if not heads:
+            return None
+        return max(min(entry['next_attempt'] for entry in heads.values()) - time.time(), 0.0)
+
+    def load(self, entry):
+        """El EncodedChunk de una entrada (None para un marcador de silencio)."""
+        if entry['file'] is None:
+            return None
+        with open(os.path.join(self.directory, entry['file']), "rb") as fp:
+            return EncodedChunk(entry['filename'], fp.read(), entry['content_type'])
+
+    def remove(self, entry_id):
+        """Elimina una entrada (enviada o caducada) y su audio."""
+        with self._lock:
+            data = self._read()
+            entry = data.pop(entry_id, None)
+            if entry is None:
+                return
+            self._write(data)
+        if entry['file']:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+
+    def failed(self, entry_id, error=None):
+        """Registra un intento fallido y programa el siguiente."""
+        with self._lock:
+            data = self._read()
+            entry = data.get(entry_id)
+            if entry is None:
+                return
+            entry['attempts'] += 1
+            entry['next_attempt'] = time.time() + self.backoff(entry['attempts'])
+            entry['last_error'] = error
+            self._write(data)
+
+    def expire(self):
+        """Descarta las entradas demasiado antiguas y, si el spool excede su tamaño, las más viejas."""
+        with self._lock:
+            data = self._read()
+        now = time.time()
+        entries = sorted(data.items(), key=lambda item: item[1]['created'])
+        expired = [entry_id for entry_id, entry in entries if now - entry['created'] > self.max_age]
+        total = sum(entry['size'] for entry_id, entry in entries if entry_id not in expired)
+        for entry_id, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_id not in expired:
+                expired.append(entry_id)
+                total -= entry['size']
+        for entry_id in expired:
+            logger.warning(f"Chunk {entry_id} caducado en el spool sin enviarse")
+            self.remove(entry_id)
+        return len(expired)
+
+    def stats(self):
+        """Chunks pendientes y bytes que ocupan."""
+        with self._lock:
+            data = self._read()
+        return {
+            'pending': len(data),
+            'bytes': sum(entry['size'] for entry in data.values()),
+            'sessions': len({entry['session'] for entry in data.values()}),
+        }
+
+
+class SpoolRetrier:
+    """Hilo que reenvía los chunks del spool cuando vence su próximo intento.
+
+    Durante cada pasada reutiliza un WebhookClient por URL (cada entrada
+    guarda la suya, así un cambio de configuración no desvía los reenvíos de
+    sesiones anteriores); los clientes se cierran al terminarla, así que la
+    siguiente usa lo que devuelva ``client_factory`` en ese momento.
+    Cada sesión se reenvía en orden de secuencia: una entrada sólo sale si
+    ya venció su próximo intento y salieron las anteriores de su sesión, y
+    un fallo detiene el resto de esa sesión pero no las demás. Si el webhook
+    rechaza el chunk en sí (``PERMANENT_STATUS``) reintentar no lo arregla:
+    la entrada se descarta para no bloquear su sesión hasta que caduque.
+    """
+
+    def __init__(self, spool, client_factory, interval=60.0):
+        self.spool = spool
+        self.interval = interval  # Máximo entre revisiones (caducidad)
+        self._client_factory = client_factory
+        self._clients = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='spool-retry', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Detiene el hilo tras el envío en curso; lo pendiente sigue en el spool."""
+        self._stop.set()
+        self.spool.added.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_clients()
+
+    def _close_clients(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+
+    def _run(self):
+        stats = self.spool.stats()
+        if stats['pending']:
+            logger.info(f"Spool: {stats['pending']} chunks pendientes de {stats['sessions']} sesiones")
+        while not self._stop.is_set():
+            try:
+                self.spool.expire()
+                self._retry_due()
+            except Exception as e:
+                logger.error(f"Error reintentando envíos del spool: {e}")
+            finally:
+                self._close_clients()
+            wait = self.spool.next_due_in()
+            self.spool.added.wait(self.interval if wait is None else min(wait, self.interval))
+            self.spool.added.clear()
+
+    def _retry_due(self):
+        now = time.time()
+        stopped = set()  # Sesiones con una entrada que aún no puede salir
+        for entry in self.spool.pending():
+            if self._stop.is_set():
+                return
+            if entry['session'] in stopped:
+                continue
+            if entry['next_attempt'] > now or not self._retry(entry):
+                stopped.add(entry['session'])
+
+    def _retry(self, entry):
+        """Reenvía una entrada. Devuelve True si ya no está en el spool."""
+        try:
+            chunk = self.spool.load(entry)
+        except OSError as exc:
+            logger.warning(f"Audio de {entry['id']} no encontrado, se descarta: {exc}")
+            self.spool.remove(entry['id'])
+            return True
+        client = self._clients.get(entry['url'])
+        if client is None:
+            client = self._clients[entry['url']] = self._client_factory(entry['url'])
+        if chunk is None:
+            success, message, status = client.send(entry['final_chunk'], metadata=entry['metadata'],
+                                                   with_status=True)
+        else:
+            success, message, status = client.send(
+                entry['final_chunk'], metadata=entry['metadata'],
+                data=chunk.data, filename=chunk.filename, content_type=chunk.content_type,
+                with_status=True
+            )
+        if success:
+            logger.info(f"Chunk {entry['id']} reenviado tras {entry['attempts']} intentos fallidos")
+            self.spool.remove(entry['id'])
+        elif status in PERMANENT_STATUS:
+            logger.warning(f"Chunk {entry['id']} rechazado por el webhook (HTTP {status}), se descarta: {message}")
+            self.spool.remove(entry['id'])
+            return True
+        else:
+            self.spool.failed(entry['id'], message)
+        return success
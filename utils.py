@@ -1,6 +1,7 @@
 """Utility functions for the Audio Capture Widget.
 All functions are stateless helpers so they can be reused from both the UI
-thread and worker threads safely.
+thread and worker threads safely. The only stateful piece is
+:class:`WebhookClient`, the upload connection pool owned by a recording.
 """
 
 from __future__ import annotations
@@ -8,9 +9,10 @@ from __future__ import annotations
 import json
 import logging
 import os
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Tuple, List, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from scipy.io import wavfile
 import numpy as np
 
@@ -22,6 +24,7 @@ __all__ = [
     "save_config",
     "merge_audio_files",
     "send_to_webhook",
+    "WebhookClient",
     "load_history",
     "save_history",
 ]
@@ -33,6 +36,15 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     "max_duration_minutes": 0,
 }
 
+# Content-Type of each chunk format accepted by the webhook
+CONTENT_TYPES: Dict[str, str] = {
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".flac": "audio/flac",
+    ".wav": "audio/wav",
+}
+
 # Path to recording history file (alongside this utils.py file)
 HISTORY_PATH: str = os.path.join(os.path.dirname(__file__), "history.json")
 
@@ -130,30 +142,153 @@ def merge_audio_files(mic_path: str, sys_path: str, output_path: str) -> None:
 # Networking helpers
 # ---------------------------------------------------------------------------
 
-def send_to_webhook(url: str, file_path: str, final_chunk: bool = False, timeout: int = 5) -> Tuple[bool, str]:
-    """Send *file_path* to *url* as multipart/form-data.
+def send_to_webhook(
+    url: str,
+    file_path: Optional[str],
+    final_chunk: bool = False,
+    timeout: Union[float, Tuple[float, float]] = 5,
+    metadata: Optional[Dict[str, Any]] = None,
+    data: Optional[bytes] = None,
+    filename: Optional[str] = None,
+    content_type: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    with_status: bool = False,
+) -> Union[Tuple[bool, str], Tuple[bool, str, Optional[int]]]:
+    """Send *file_path* (or the in-memory *data*) to *url* as multipart/form-data.
+
+    *metadata* entries (chunk start, duration, silence flags...) are sent as
+    extra form fields. When *data* is given it is uploaded as *filename*
+    without touching the disk; *content_type* defaults to the one matching
+    the extension. When neither *file_path* nor *data* is given only the form
+    fields are posted, which is how silence markers are delivered.
+
+    *timeout* is either a single value or a *(connect, read)* pair. When a
+    *session* is given the request reuses its pooled connections instead of
+    opening a new one.
 
     Returns *(success, message)* where *success* is ``True`` when the request
-    completed with a 2xx status code.
+    completed with a 2xx status code. With *with_status* the HTTP status code
+    is appended, or ``None`` when no response was received (connection error
+    or timeout), so callers can tell a rejected chunk from an unreachable
+    webhook.
     """
-    logging.info("Uploading '%s' to webhook '%s'", file_path, url)
-    try:
+    post = (session or requests).post
+    fields = {"final_chunk": str(final_chunk).lower()}
+    for key, value in (metadata or {}).items():
+        fields[key] = str(value).lower() if isinstance(value, bool) else str(value)
+
+    def result(success: bool, message: str, status: Optional[int]):
+        return (success, message, status) if with_status else (success, message)
+
+    if file_path is None and data is None:
+        logging.info("Posting metadata-only message to webhook '%s'", url)
+        try:
+            response = post(url, data=fields, timeout=timeout)
+            response.raise_for_status()
+            return result(True, response.text, response.status_code)
+        except requests.RequestException as exc:
+            logging.error("Webhook upload failed: %s", exc)
+            return result(False, str(exc), getattr(exc.response, "status_code", None))
+
+    name = filename or os.path.basename(file_path or "chunk")
+    if content_type is None:
         # Determinar el Content-Type correcto basado en la extensión
-        file_extension = os.path.splitext(file_path)[1].lower()
-        if file_extension == '.mp3':
-            content_type = "audio/mpeg"
-        elif file_extension == '.wav':
-            content_type = "audio/wav"
+        file_extension = os.path.splitext(name)[1].lower()
+        content_type = CONTENT_TYPES.get(file_extension, "application/octet-stream")
+
+    logging.info("Uploading '%s' to webhook '%s'", name, url)
+    try:
+        if data is not None:
+            files = {"file": (name, data, content_type)}
+            response = post(url, files=files, data=fields, timeout=timeout)
         else:
-            content_type = "audio/mpeg"  # Default fallback
-        
-        with open(file_path, "rb") as fp:
-            files = {"file": (os.path.basename(file_path), fp, content_type)}
-            data = {"final_chunk": str(final_chunk).lower()}
-            response = requests.post(url, files=files, data=data, timeout=timeout)
+            with open(file_path, "rb") as fp:
+                files = {"file": (name, fp, content_type)}
+                response = post(url, files=files, data=fields, timeout=timeout)
         response.raise_for_status()
         logging.info("Webhook upload succeeded: %s", response.status_code)
-        return True, response.text
+        return result(True, response.text, response.status_code)
     except requests.RequestException as exc:
         logging.error("Webhook upload failed: %s", exc)
-        return False, str(exc)
+        return result(False, str(exc), getattr(exc.response, "status_code", None))
+
+
+class WebhookClient:
+    """Long-lived upload client reused by every chunk of a recording.
+
+    Wraps a :class:`requests.Session` so consecutive uploads share kept-alive
+    TCP/TLS connections instead of paying a new handshake per chunk.
+
+    Parameters
+    ----------
+    url : str
+        Webhook that receives the chunks.
+    pool_size : int
+        Maximum connections kept open per host; requests beyond it wait for
+        a free connection instead of opening extra ones.
+    keep_alive : bool
+        When ``False`` every request asks the server to close the connection.
+    connect_timeout : float
+        Seconds allowed to establish the connection (and for each socket
+        write while the body is sent).
+    read_timeout : float
+        Seconds to wait for the response of an empty request.
+    read_timeout_per_mb : float
+        Extra seconds of read timeout per MB of payload, since the webhook
+        answers once it has received (and usually processed) the whole file.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 2,
+        keep_alive: bool = True,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        read_timeout_per_mb: float = 10.0,
+    ) -> None:
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.read_timeout_per_mb = read_timeout_per_mb
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(int(pool_size), 1), pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def timeout_for(self, size: int) -> Tuple[float, float]:
+        """Return the *(connect, read)* timeout for a payload of *size* bytes."""
+        read = self.read_timeout + size / (1024 * 1024) * self.read_timeout_per_mb
+        return self.connect_timeout, read
+
+    def send(
+        self,
+        final_chunk: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        with_status: bool = False,
+    ) -> Union[Tuple[bool, str], Tuple[bool, str, Optional[int]]]:
+        """Upload one chunk (or a metadata-only marker when *data* is ``None``).
+
+        See :func:`send_to_webhook` for the arguments and the return value.
+        """
+        return send_to_webhook(
+            self.url,
+            None,
+            final_chunk,
+            timeout=self.timeout_for(len(data) if data is not None else 0),
+            metadata=metadata,
+            data=data,
+            filename=filename,
+            content_type=content_type,
+            session=self.session,
+            with_status=with_status,
+        )
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()